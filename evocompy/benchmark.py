@@ -1,5 +1,12 @@
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
 from .evolution import Evolution
-from .io import CSVWriter
+from .io import CSVWriter, Checkpointer
 
 def condition_generation(n):
     """ Returns a condition function that can be passed to a Benchmark and
@@ -11,34 +18,272 @@ def condition_best_fitness(v):
     """ Returns a condition function that can be passed to a Benchmark and 
         stops the benchmark when the best fitness is greater than or equal to v. 
     """
-    return lambda evolution: evolution.get_fittest_individual()[1] < v
+    return lambda evolution: _best_fitness(evolution, 'condition_best_fitness') < v
+
+def condition_evaluations(n):
+    """ Returns a condition function that can be passed to a Benchmark and
+        stops the benchmark once n fitness evaluations have been spent.
+    """
+    return lambda evolution: evolution.evaluations < n
+
+def condition_time(seconds):
+    """ Returns a condition function that can be passed to a Benchmark and
+        stops the benchmark when an evolution has been running for the given number of seconds,
+        counted from the first time the condition is checked for it.
+    """
+    starts = {}
+    def result(evolution):
+        start = starts.setdefault(id(evolution), time.monotonic())
+        return time.monotonic() - start < seconds
+    return result
+
+def condition_stagnation(k, tolerance=0.0):
+    """ Returns a condition function that can be passed to a Benchmark and
+        stops the benchmark when the best fitness has not improved by more than tolerance for k generations.
+    """
+    # The best fitness and the generation in which it was reached, for every evolution.
+    records = {}
+    def result(evolution):
+        best = _best_fitness(evolution, 'condition_stagnation')
+        record = records.get(id(evolution))
+        if record is None or (best - record[0] > tolerance if evolution.proportional else record[0] - best > tolerance):
+            record = records[id(evolution)] = (best, evolution.generation)
+        return evolution.generation - record[1] < k
+    return result
+
+def _best_fitness(evolution, condition):
+    best = evolution.get_best_fitness()
+    if np.ndim(best) > 0:
+        raise ValueError(f"{condition} needs a single objective.")
+    return best
+
+def condition_diversity(threshold):
+    """ Returns a condition function that can be passed to a Benchmark and
+        stops the benchmark when the diversity of the population (see Evolution.get_diversity) drops below threshold.
+    """
+    return lambda evolution: evolution.get_diversity() >= threshold
+
+def condition_all(*conditions):
+    """ Returns a condition function that continues as long as all of the given conditions do,
+        i.e. the benchmark stops as soon as one of them is met. All conditions are checked every time,
+        so that stateful conditions like condition_stagnation see every generation.
+    """
+    return lambda evolution: all([condition(evolution) for condition in conditions])
+
+def condition_any(*conditions):
+    """ Returns a condition function that continues as long as any of the given conditions does,
+        i.e. the benchmark stops once all of them are met. All conditions are checked every time.
+    """
+    return lambda evolution: any([condition(evolution) for condition in conditions])
 
 class Benchmark:
     """ The Benchmark class is a test runner that allows the user to run a set of evolutions
         without an interface. The condition argument is a function that takes the evolution
         as an argument and returns a boolean that determines if the program should continue
-        running.
+        running. If a checkpoint directory is given, every evolution is checkpointed into its own
+        subdirectory every checkpoint_interval generations and at the end of its run, and resumed
+        from its latest checkpoint when the benchmark is run again.
     """
-    def __init__(self, evolutions, condition):
+    def __init__(self, evolutions, condition, checkpoint_dir=None, checkpoint_interval=100):
         self.evolutions = evolutions
         self.condition = condition
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
 
     def run(self):
         """ Runs the benchmark. """
-        for evolution in self.evolutions:
-            while self.condition(evolution):
-                evolution.step()
+        for index, evolution in enumerate(self.evolutions):
+            self._run(index, evolution)
+
+    def _run(self, index, evolution):
+        checkpointer = None
+        if self.checkpoint_dir is not None:
+            checkpointer = Checkpointer(os.path.join(self.checkpoint_dir, f"run{index}"), self.checkpoint_interval)
+            checkpointer.resume(evolution)
+            evolution.checkpointer = checkpointer
+        while self.condition(evolution):
+            evolution.step()
+        if checkpointer is not None:
+            checkpointer.save(evolution)
+        # Buffered writers only write their remaining rows when they are finalized.
+        evolution.finalize_writer()
+
+class ParallelBenchmark(Benchmark):
+    """ Benchmark that runs its evolutions independently of each other on a pool of worker processes.
+        Every evolution keeps its own generator, so the results match those of a Benchmark and do not depend on which
+        worker a run ends up on; create the evolutions with a seed to make them reproducible. After run() returns, each evolution holds its final population, fitness values and generation.
+        The writers are finalized inside the workers; writers that implement collect() and restore(state) get the data
+        they gathered in the worker back in the parent.
+        The workers are forked, so neither the evolutions nor the condition need to be picklable. Where fork is
+        not available, the runs are executed one after another in the current process.
+    """
+    def __init__(self, evolutions, condition, workers=None, checkpoint_dir=None, checkpoint_interval=100):
+        super().__init__(evolutions, condition, checkpoint_dir, checkpoint_interval)
+        self.workers = workers or os.cpu_count()
+        self.results = []
+
+    def run(self):
+        """ Runs the benchmark. """
+        global _benchmark
+        _benchmark = self
+        try:
+            if _can_fork():
+                with multiprocessing.get_context('fork').Pool(min(self.workers, len(self.evolutions) or 1)) as pool:
+                    self.results = pool.map(_run_evolution, range(len(self.evolutions)))
+            else:
+                self.results = [_run_evolution(index) for index in range(len(self.evolutions))]
+        finally:
+            _benchmark = None
+        for evolution, result in zip(self.evolutions, self.results):
+            result.apply(evolution)
+
+class RunResult:
+    """ Final state of an evolution that was run by a ParallelBenchmark. """
+    def __init__(self, population, fitness_values, generation, writer_state=None, evaluations=0, stats=None):
+        self.population = population
+        self.fitness_values = fitness_values
+        self.generation = generation
+        self.writer_state = writer_state
+        self.evaluations = evaluations
+        self.stats = stats
+
+    @classmethod
+    def of(cls, evolution):
+        """ Finalizes the writer of the evolution and returns its final state. """
+        evolution.finalize_writer()
+        writer_state = None
+        if hasattr(evolution.writer, 'collect'):
+            writer_state = evolution.writer.collect()
+        return cls(evolution.current_population, evolution.current_fitness_values, evolution.generation, writer_state, 
+            evolution.evaluations, evolution.stats)
+
+    def apply(self, evolution):
+        """ Copies the state into the given evolution and restores the state of its writer. """
+        evolution.current_population = self.population
+        evolution.current_fitness_values = self.fitness_values
+        evolution.generation = self.generation
+        evolution.evaluations = self.evaluations
+        evolution.stats = self.stats
+        if self.writer_state is not None:
+            evolution.writer.restore(self.writer_state)
+
+# The benchmark that is currently run. Forked workers inherit it, so the evolutions do not have to be pickled.
+_benchmark = None
+
+def _run_evolution(index):
+    evolution = _benchmark.evolutions[index]
+    _seed(evolution)
+    _benchmark._run(index, evolution)
+    return RunResult.of(evolution)
+
+def _seed(evolution):
+    # The evolution keeps its own generator, which has already drawn its initial population. The global generators are
+    # seeded from the seed sequence of the evolution, as user defined functions might still draw from them.
+    state = evolution.seed_sequence.generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(state[1])
+
+def _can_fork():
+    return 'fork' in multiprocessing.get_all_start_methods()
 
 class AverageEvolution:
-    def __init__(self, count, *args, **kwargs):
-        self.evolutions = []
+    """ Runs count replicas of the same evolution with independent seeds, spawned from seed, in lockstep. The arguments
+        are passed on to evolution_class. After every step the writer (e.g. an AverageCSVWriter) is called with the 
+        AverageEvolution, so that statistics over all replicas end up in a single output. If no replica uses a fitness cache,
+        the new populations of all replicas are evaluated together in a single call of the fitness function.
+        The statistics are averaged over the replicas, so an AverageEvolution can be run by a Benchmark. Averaging needs a
+        single objective, so fitness functions with several objectives are rejected.
+    """
+    def __init__(self, count, *args, writer=None, seed=None, evolution_class=Evolution, **kwargs):
         self.count = count
-        self.writer = AverageCSVWriter()
-        for _ in range(self.count):
-            self.evolutions.append(Evolution(*args, writer=self.writer, **kwargs))
+        self.writer = writer
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.evolutions = [evolution_class(*args, seed=replica_seed, **kwargs) for replica_seed in self.seed_sequence.spawn(count)]
+        if any(np.ndim(evolution.current_fitness_values) > 1 for evolution in self.evolutions):
+            raise ValueError("AverageEvolution needs a single objective.")
+        self._write_to_writer()
 
-    def step(self): 
+    def step(self):
+        """ Generates the next population of every replica. """
+        pending = [evolution for evolution in self.evolutions if evolution._begin_step()]
+        if pending:
+            self._compute_fitness_values(pending)
         for evolution in self.evolutions:
-            evolution.step()
+            evolution._end_step()
+        self._write_to_writer()
+
+    @property
+    def generation(self):
+        return self.evolutions[0].generation
+
+    @property
+    def proportional(self):
+        return self.evolutions[0].proportional
+
+    @property
+    def evaluations(self):
+        return sum(evolution.evaluations for evolution in self.evolutions)
+
+    def get_statistics(self):
+        """ Returns an array with one row per replica that holds its best, mean and median fitness. """
+        return np.array([[evolution.get_best_fitness(), evolution.get_mean_fitness(), evolution.get_median_fitness()] 
+            for evolution in self.evolutions])
+
+    def get_fittest_individual(self):
+        """ Returns a 2-tuple with the fittest individual of all replicas and its fitness value. """
+        fittest = [evolution.get_fittest_individual() for evolution in self.evolutions]
+        choose = max if self.proportional else min
+        return choose(fittest, key=lambda pair: pair[1])
+
+    def get_best_fitness(self):
+        """ Computes the mean over the replicas of the best fitness. """
+        return np.mean([evolution.get_best_fitness() for evolution in self.evolutions])
+
+    def get_mean_fitness(self):
+        """ Computes the mean over the replicas of the mean fitness. """
+        return np.mean([evolution.get_mean_fitness() for evolution in self.evolutions])
+
+    def get_median_fitness(self):
+        """ Computes the mean over the replicas of the median fitness. """
+        return np.mean([evolution.get_median_fitness() for evolution in self.evolutions])
+
+    def get_diversity(self):
+        """ Computes the mean over the replicas of the diversity. """
+        return np.mean([evolution.get_diversity() for evolution in self.evolutions])
+
+    def finalize_writer(self):
+        """ Calls the finalize method of the used writer and of the writers of the replicas. """
+        for evolution in self.evolutions:
+            evolution.finalize_writer()
+        if self.writer is not None:
+            self.writer.finalize()
+
+    def shutdown_executor(self):
+        """ Stops the workers of the executors of the replicas. """
+        for evolution in self.evolutions:
+            evolution.shutdown_executor()
 
+    def _compute_fitness_values(self, pending):
+        # The populations are stacked and evaluated by the first replica (with its executor, if it has one).
+        # Replicas with a fitness cache or populations of different shapes are evaluated separately.
+        first = pending[0]
+        if any(evolution.fitness_cache is not None for evolution in pending) or \
+                len({(evolution.current_population.shape[1:], evolution.current_population.dtype) for evolution in pending}) > 1:
+            for evolution in pending:
+                evolution._compute_fitness_values()
+            return
+        populations = [evolution.current_population for evolution in pending]
+        population = np.concatenate(populations)
+        start = time.perf_counter()
+        fitness_values = first._evaluate(population)
+        seconds = time.perf_counter() - start
+        # Every replica counts its own evaluations and is charged its share of the time of the joint call.
+        for evolution, values in zip(pending, np.split(fitness_values, np.cumsum([len(p) for p in populations])[:-1])):
+            evolution.current_fitness_values = values
+            evolution.evaluations += len(values)
+            if evolution.stats is not None:
+                evolution.stats.record('fitness', seconds * len(values) / len(population), len(values))
 
+    def _write_to_writer(self):
+        if self.writer is not None:
+            self.writer.step(self)
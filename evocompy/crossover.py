@@ -0,0 +1,143 @@
+import numpy as np
+
+# Crossover Functions:
+# A crossover function receives two arrays of parents of the same shape, one parent per row, and a generator (rng).
+# It returns an array with one child per pair of parents. They are turned into genetic operators by crossover_operator.
+# The permutation operators (order_crossover, partially_mapped_crossover, edge_recombination) always produce
+# valid permutations of the values 0..n-1, e.g. tours of the TSP example.
+
+def order_crossover(parents_a, parents_b, rng=None):
+    """ Order crossover (OX). The child inherits a random segment of parent a at the same positions, the remaining
+        positions are filled with the missing values in the order they appear in parent b, starting after the segment.
+    """
+    rows, length = parents_a.shape
+    i, j = _cut_points(rows, length, rng)
+    positions = np.arange(length)
+    segment = (positions >= i[:, np.newaxis]) & (positions < j[:, np.newaxis])
+    rotated = (j[:, np.newaxis] + positions) % length
+    rotated_b = np.take_along_axis(parents_b, rotated, axis=1)
+    keep = ~np.take_along_axis(_membership(parents_a, segment), rotated_b, axis=1)
+    free = ~np.take_along_axis(segment, rotated, axis=1)
+    children = parents_a.copy()
+    # Both masks select length - len(segment) entries per row, so the flattened selections line up row by row.
+    children[np.nonzero(free)[0], rotated[free]] = rotated_b[keep]
+    return children
+
+
+def partially_mapped_crossover(parents_a, parents_b, rng=None):
+    """ Partially mapped crossover (PMX). The child inherits a random segment of parent a and all other values from parent b. 
+        Values of b that are already part of the segment are replaced by following the mapping between the segments of a and b.
+    """
+    rows, length = parents_a.shape
+    i, j = _cut_points(rows, length, rng)
+    positions = np.arange(length)
+    segment = (positions >= i[:, np.newaxis]) & (positions < j[:, np.newaxis])
+    member = _membership(parents_a, segment)
+    inverse_a = np.argsort(parents_a, axis=1)
+    values = parents_b.copy()
+    conflicts = ~segment & np.take_along_axis(member, values, axis=1)
+    while np.any(conflicts):
+        mapped = np.take_along_axis(parents_b, np.take_along_axis(inverse_a, values, axis=1), axis=1)
+        values = np.where(conflicts, mapped, values)
+        conflicts &= np.take_along_axis(member, values, axis=1)
+    return np.where(segment, parents_a, values)
+
+
+def edge_recombination(parents_a, parents_b, rng=None):
+    """ Edge recombination crossover (ERX). The child is built node by node, always continuing with the neighbour (in either parent)
+        that has the fewest unused neighbours left, so that it consists mostly of edges found in its parents. All pairs are processed together,
+        one position at a time.
+    """
+    rng = np.random.default_rng(rng)
+    rows, length = parents_a.shape
+    row_index = np.arange(rows)[:, np.newaxis]
+    neighbours = np.concatenate([_neighbours(parents_a), _neighbours(parents_b)], axis=2)
+    # Edges that occur in both parents are only counted once.
+    duplicate = np.zeros(neighbours.shape, dtype=bool)
+    duplicate[:, :, 2:] = np.any(neighbours[:, :, 2:, np.newaxis] == neighbours[:, :, np.newaxis, :2], axis=3)
+    neighbours[duplicate] = -1
+    used = np.zeros((rows, length), dtype=bool)
+    children = np.empty_like(parents_a)
+    current = parents_a[:, 0]
+    for position in range(length):
+        children[:, position] = current
+        used[row_index[:, 0], current] = True
+        if position == length - 1:
+            break
+        candidates = neighbours[row_index[:, 0], current]
+        valid = (candidates >= 0) & ~used[row_index, np.maximum(candidates, 0)]
+        candidate_neighbours = neighbours[row_index, np.maximum(candidates, 0)]
+        degrees = np.sum((candidate_neighbours >= 0) & ~used[row_index[:, :, np.newaxis], np.maximum(candidate_neighbours, 0)], axis=2)
+        scores = np.where(valid, degrees + 0.5 * rng.random(candidates.shape), np.inf)
+        current = candidates[row_index[:, 0], np.argmin(scores, axis=1)]
+        # Without an unused neighbour, the walk continues at a random unused node.
+        stuck = np.flatnonzero(~np.any(valid, axis=1))
+        if len(stuck):
+            current[stuck] = np.argmin(np.where(used[stuck], np.inf, rng.random((len(stuck), length))), axis=1)
+    return children
+
+
+def blend_crossover(alpha=0.5):
+    """ Returns the blend crossover (BLX-alpha) for real-valued genomes. Each gene of the child is drawn uniformly from the interval
+        spanned by the parents' genes, extended by alpha times its width on both sides.
+    """
+    def result(parents_a, parents_b, rng=None):
+        low, high = np.minimum(parents_a, parents_b), np.maximum(parents_a, parents_b)
+        extent = alpha * (high - low)
+        return np.random.default_rng(rng).uniform(low - extent, high + extent)
+    return result
+
+
+def simulated_binary_crossover(eta=15):
+    """ Returns the simulated binary crossover (SBX) for real-valued genomes. The larger the distribution index eta, 
+        the closer the children are to their parents. One of the two children of each pair is returned at random.
+    """
+    def result(parents_a, parents_b, rng=None):
+        rng = np.random.default_rng(rng)
+        u = rng.random(parents_a.shape)
+        beta = np.where(u <= 0.5, (2 * u)**(1 / (eta + 1)), (1 / (2 * (1 - u)))**(1 / (eta + 1)))
+        sign = np.where(rng.random(parents_a.shape) < 0.5, 1, -1)
+        return 0.5 * ((1 + sign * beta) * parents_a + (1 - sign * beta) * parents_b)
+    return result
+
+
+# Crossover functions and the functions that create them, by name. See to_crossover.
+crossover_dict = {
+    'order': order_crossover,
+    'pmx': partially_mapped_crossover,
+    'edge': edge_recombination,
+}
+
+crossover_factory_dict = {
+    'blend': blend_crossover,
+    'sbx': simulated_binary_crossover,
+}
+
+def to_crossover(string):
+    """ Creates a crossover function from a string of the form '<name>' or '<name> <value>', e.g. 'order' or 'blend 0.5'. """
+    name, *values = string.split(' ')
+    if name in crossover_dict:
+        return crossover_dict[name]
+    return crossover_factory_dict[name](*[float(value) for value in values])
+
+
+def _cut_points(rows, length, rng):
+    # Returns two arrays i <= j, defining the segment [i, j) for every row.
+    a, b = np.random.default_rng(rng).integers(0, length + 1, (2, rows))
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def _membership(parents, mask):
+    # member[r, v] is True if the value v appears at a masked position of parents[r].
+    member = np.zeros(parents.shape, dtype=bool)
+    np.put_along_axis(member, parents, mask, axis=1)
+    return member
+
+
+def _neighbours(parents):
+    # Returns an array of shape (rows, length, 2) with the predecessor and successor of every value in the tours.
+    inverse = np.argsort(parents, axis=1)
+    length = parents.shape[1]
+    previous = np.take_along_axis(parents, (inverse - 1) % length, axis=1)
+    following = np.take_along_axis(parents, (inverse + 1) % length, axis=1)
+    return np.stack([previous, following], axis=2)
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Distributions are used to draw the values by which real-valued genomes are mutated. They are backed by a 
+# numpy.random.Generator, calling a distribution without arguments returns a single value, calling it with
+# a size (e.g. the shape of the population) returns an array of values drawn at once. Operators pass the
+# generator of their evolution as rng, the distribution's own generator is only used when there is none.
+
+class Distribution:
+    """ Base class of all distributions. If no generator is given, a new one is created with a random seed. """
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def __call__(self, size=None, rng=None):
+        return self.sample(size, self.rng if rng is None else rng)
+
+    def sample(self, size, rng):
+        """ Draws size values using rng. """
+        raise NotImplementedError
+
+
+class Uniform(Distribution):
+    """ Uniform distribution between -step and step. """
+    def __init__(self, step, rng=None):
+        super().__init__(rng)
+        self.step = step
+
+    def sample(self, size, rng):
+        return rng.uniform(-self.step, self.step, size)
+
+    def __repr__(self):
+        return f"uniform {self.step}"
+
+
+class Normal(Distribution):
+    """ Normal distribution with mean 0 and standard deviation sigma. """
+    def __init__(self, sigma, rng=None):
+        super().__init__(rng)
+        self.sigma = sigma
+
+    def sample(self, size, rng):
+        return rng.normal(0, self.sigma, size)
+
+    def __repr__(self):
+        return f"normal {self.sigma}"
+
+
+distribution_dict = {
+    'uniform': Uniform,
+    'normal': Normal,
+}
+
+def to_distribution(string):
+    """ Creates a distribution from a string of the form '<name> <value>', e.g. 'uniform 0.5' or 'normal 0.1'. """
+    dist, value = string.split(' ')
+    return distribution_dict[dist](float(value))
@@ -1,139 +1,442 @@
 import csv
+import json
+import os
 import random
+from collections import OrderedDict
 
 import numpy as np
 
+# The selection schemes live in selection.py; they are imported here for backwards compatibility.
+from .selection import cutoff_selection, roulette_wheel_selection
+from .selection import _order
+from .parallel import to_executor
+from .profiling import EvolutionStats, timed
+
+# Ways in which the next generation replaces the current one, see Evolution.
+REPLACEMENTS = ('generational', 'elitist', 'steady_state', 'plus')
+
 class Evolution:
-    """ Implementation of an evolutionary algorithm that removes the need for boilerplate code. """
-    def __init__(self, population_size, random_function, fitness_function, selection_scheme, genetic_operators, proportional=True, writer=None):
+    """ Implementation of an evolutionary algorithm that removes the need for boilerplate code. 
+        The population is kept in one of two preallocated arrays, the next generation is built in the other one.
+        Genetic operators receive that array and may modify it in place.
+        Every evolution owns a numpy.random.Generator (rng), created from seed, which is passed to the random functions, 
+        the selection scheme and the genetic operators. Two evolutions with the same seed produce the same results.
+        If profile is set, the wall time, calls and fitness evaluations of each stage of every generation are recorded in stats
+        (see profiling.py). profile can also be an EvolutionStats instance to record into.
+        replacement determines how the next generation is formed:
+        'generational' replaces the whole population by the selected and modified individuals,
+        'elitist' keeps the elite_count fittest individuals unchanged and replaces the rest,
+        'steady_state' only replaces the replace_count least fit individuals (by default a tenth of the population),
+        'plus' creates population_size offspring, which compete with their parents for the places in the next generation.
+        In the latter three modes only the offspring that differ from their parents are evaluated; the selection scheme
+        has to support size.
+        The fitness function may return one value per objective, see multiobjective.py.
+    """
+    def __init__(self, population_size, random_function, fitness_function, selection_scheme, genetic_operators, proportional=True, writer=None, cache_size=None, batch_fitness_function=None, executor=None, batch_random_function=None, checkpointer=None, seed=None, profile=False,
+            replacement='generational', elite_count=1, replace_count=None):
         self.population_size = population_size
         self.random_function = random_function
+        self.batch_random_function = batch_random_function
         self.fitness_function = fitness_function
+        self.batch_fitness_function = batch_fitness_function
         self.selection_scheme = selection_scheme
         self.genetic_operators = genetic_operators
         
         self.proportional = proportional
+        if replacement not in REPLACEMENTS:
+            raise ValueError(f"Unknown replacement {replacement!r}, expected one of {', '.join(REPLACEMENTS)}.")
+        self.replacement = replacement
+        self.elite_count = elite_count
+        self.replace_count = replace_count if replace_count is not None else max(1, population_size // 10)
+        # Every generation has to produce at least one offspring.
+        if replacement == 'elitist' and not 0 <= self.elite_count < population_size:
+            raise ValueError(f"elite_count must be at least 0 and less than the population size {population_size}, got {self.elite_count}.")
+        if replacement == 'steady_state' and not 1 <= self.replace_count <= population_size:
+            raise ValueError(f"replace_count must be between 1 and the population size {population_size}, got {self.replace_count}.")
         self.writer = writer
+        self.checkpointer = checkpointer
+        self.fitness_cache = FitnessCache(cache_size) if cache_size else None
+        self.executor = to_executor(executor)
 
         self.generation = 0
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
 
-        self.current_population = self._generate_initial_population()
+        # Number of individuals passed to the fitness function so far. Cached individuals are not counted.
+        self.evaluations = 0
+        self.stats = None
+        if profile:
+            self.stats = profile if isinstance(profile, EvolutionStats) else EvolutionStats()
+            self.stats.start()
+
+        self._buffers = None
+        self._statistics = None
+        self.current_population = timed(self, 'initialization', self._generate_initial_population)
         self.current_fitness_values = []
         self._compute_fitness_values()
         self._write_to_writer()
 
     def step(self):
         """ Generates the next population. """
-        self.current_population = self._generate_next_population()
-        self._compute_fitness_values()
-        self._write_to_writer()
-        self.generation += 1
+        if self._begin_step():
+            self._compute_fitness_values()
+        self._end_step()
 
     def get_fittest_individual(self):
         """ Returns a 2-tuple with the fittest individual and its fitness value. """
-        fittest = max(self.current_population, key=self.fitness_function) if self.proportional else min(self.current_population, key=self.fitness_function)
-        return (fittest, self.fitness_function(fittest))
+        index = self._fittest_index()
+        return (self.current_population[index].copy(), self.current_fitness_values[index])
     
+    def get_fittest_individuals(self, k):
+        """ Returns a 2-tuple with copies of the k fittest individuals and their fitness values. """
+        indices = self._fittest_first()[:k]
+        return (self.current_population[indices], np.asarray(self.current_fitness_values)[indices])
+
+    def replace_least_fit(self, individuals, fitness_values):
+        """ Replaces the least fit individuals of the current population with the given individuals, whose fitness values are already known. """
+        indices = self._fittest_first()[::-1][:len(individuals)]
+        self.current_population[indices] = individuals
+        self.current_fitness_values = np.asarray(self.current_fitness_values).copy()
+        self.current_fitness_values[indices] = fitness_values
+
+    def spawn(self, n):
+        """ Returns n independent generators derived from the seed of this evolution, e.g. for worker processes. """
+        return [np.random.default_rng(seed) for seed in self.seed_sequence.spawn(n)]
+
+    def get_best_fitness(self):
+        """ Returns the fitness value of the fittest individual of the current population. 
+            With several objectives, this is the individual that comes first in the crowded comparison (see multiobjective.py).
+        """
+        return self._statistic('best', lambda: self.current_fitness_values[self._fittest_index()])
+
     def get_mean_fitness(self):
-        """ Computes the mean fitness of the current population. """
-        return np.mean(self.current_fitness_values)
+        """ Computes the mean fitness of the current population, per objective if there are several. """
+        return self._statistic('mean', lambda: np.mean(self.current_fitness_values, axis=0))
 
     def get_median_fitness(self):
-        """ Computes the median fitness of the current population. """        
-        return np.median(self.current_fitness_values)
+        """ Computes the median fitness of the current population, per objective if there are several. """        
+        return self._statistic('median', lambda: np.median(self.current_fitness_values, axis=0))
+
+    def get_diversity(self):
+        """ Computes the diversity of the current population as the mean standard deviation of the genes. 
+            It drops to 0 once all individuals are identical.
+        """
+        return self._statistic('diversity', lambda: float(np.mean(np.std(self.current_population, axis=0))))
     
+    def save_checkpoint(self, path):
+        """ Writes the population, the fitness values, the generation and evaluation counters and the states of the random number 
+            generators into a binary .npz file. The file is replaced atomically, so a crash never leaves a broken checkpoint behind.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, mode='wb') as f:
+            np.savez(f, population=self.current_population, fitness_values=np.asarray(self.current_fitness_values), 
+                generation=self.generation, evaluations=self.evaluations, rng_states=np.array(self._rng_states()))
+        os.replace(temporary, path)
+
+    def load_checkpoint(self, path):
+        """ Restores a state written by save_checkpoint. Continuing from it gives the same results as the original run. """
+        with np.load(path) as checkpoint:
+            self.current_population = checkpoint['population'].copy()
+            self.current_fitness_values = checkpoint['fitness_values'].copy()
+            self.generation = int(checkpoint['generation'])
+            if 'evaluations' in checkpoint.files:
+                self.evaluations = int(checkpoint['evaluations'])
+            self._set_rng_states(str(checkpoint['rng_states']))
+
     def finalize_writer(self):
         """ Calls the finalize method of the used writer, if there is one. """
         if self.writer is not None:
             self.writer.finalize()
 
+    def shutdown_executor(self):
+        """ Stops the workers of the used executor, if there is one. """
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _begin_step(self):
+        # Generates the next population. Returns True if its fitness values still have to be computed.
+        if self.stats is not None:
+            self.stats.start()
+        self.current_population, fitness_values = self._generate_next_population()
+        if fitness_values is None:
+            return True
+        self.current_fitness_values = fitness_values
+        return False
+
+    def _end_step(self):
+        self._write_to_writer()
+        self.generation += 1
+        if self.checkpointer is not None:
+            timed(self, 'checkpoint', self.checkpointer.step, self)
+
     def _compute_fitness_values(self):
-        self.current_fitness_values = np.array(list(map(self.fitness_function, self.current_population)))
+        self.current_fitness_values = timed(self, 'fitness', self._fitness, self.current_population)
+
+    def _fitness(self, population):
+        if self.fitness_cache is None:
+            self.evaluations += len(population)
+            return self._evaluate(population)
+        # Only the individuals that were not cached count as evaluations.
+        misses = self.fitness_cache.misses
+        fitness_values = self.fitness_cache.evaluate(population, self._evaluate)
+        self.evaluations += self.fitness_cache.misses - misses
+        return fitness_values
+
+    def _evaluate(self, population):
+        # The batch fitness function receives the whole 2-D population (or a chunk of it) and returns a fitness vector.
+        batch = self.batch_fitness_function is not None
+        function = self.batch_fitness_function if batch else self.fitness_function
+        if self.executor is not None:
+            return self.executor.evaluate(function, population, batch=batch)
+        if batch:
+            return np.asarray(function(population))
+        return np.array(list(map(function, population)))
+
+    def _rng_states(self):
+        # The global generators are saved as well, as user defined functions might still draw from them. The states are
+        # stored as JSON, so that checkpoints can be loaded without unpickling. Arrays in the states become lists.
+        states = {'rng': self.rng.bit_generator.state, 'random': random.getstate(), 'numpy': np.random.get_state(legacy=False)}
+        return json.dumps(states, default=lambda array: array.tolist())
+
+    def _set_rng_states(self, text):
+        states = json.loads(text)
+        self.rng.bit_generator.state = states['rng']
+        version, internal_state, gauss = states['random']
+        random.setstate((version, tuple(internal_state), gauss))
+        np.random.set_state(states['numpy'])
+
+    def _statistic(self, name, compute):
+        # Statistics are computed at most once per generation. The cache is keyed by the generation and the current arrays,
+        # so it is invalidated by step, replace_least_fit and load_checkpoint alike.
+        cached = self._statistics
+        if (cached is None or cached[0] != self.generation or cached[1] is not self.current_population 
+                or cached[2] is not self.current_fitness_values):
+            cached = self._statistics = (self.generation, self.current_population, self.current_fitness_values, {})
+        values = cached[3]
+        if name not in values:
+            values[name] = compute()
+        return values[name]
+
+    def _fittest_index(self):
+        if np.ndim(self.current_fitness_values) > 1:
+            return _order(self.current_fitness_values, self.proportional)[-1]
+        return np.argmax(self.current_fitness_values) if self.proportional else np.argmin(self.current_fitness_values)
+
+    def _fittest_first(self):
+        # Indices that sort the population from the most to the least fit individual.
+        if np.ndim(self.current_fitness_values) > 1:
+            return _order(self.current_fitness_values, self.proportional)[::-1]
+        order = np.argsort(self.current_fitness_values, kind='stable')
+        return order[::-1] if self.proportional else order
 
     def _generate_initial_population(self):
-        initial_population = []
-        for _ in range(self.population_size):
-            individual = self.random_function()
-            initial_population.append(individual)
-        return np.array(initial_population)
+        # The batch random function receives the population size and the generator and returns the whole initial population.
+        if self.batch_random_function is not None:
+            population = np.asarray(self.batch_random_function(self.population_size, self.rng))
+            initial_population = self._buffer(population.shape, population.dtype)
+            initial_population[...] = population
+            return initial_population
+        first = np.asarray(self.random_function(self.rng))
+        initial_population = self._buffer((self.population_size, *first.shape), first.dtype)
+        initial_population[0] = first
+        for i in range(1, self.population_size):
+            initial_population[i] = self.random_function(self.rng)
+        return initial_population
 
     def _generate_next_population(self):
-        next_population = self.selection_scheme(self.current_population, self.fitness_function, self.proportional)
-        for operator in self.genetic_operators:
-            next_population = operator(next_population, self.population_size)
-        return np.array(next_population)
+        # Returns the next population and its fitness values, if they are still known after applying the operators.
+        if self.replacement == 'generational':
+            indices = self._select(self.current_fitness_values)
+            next_population = self._buffer((len(indices), *self.current_population.shape[1:]), self.current_population.dtype)
+            np.take(self.current_population, indices, axis=0, out=next_population)
+            return self._apply_operators(next_population, indices, self.population_size)
+
+        fitness_values = np.asarray(self.current_fitness_values)
+        if self.replacement == 'plus':
+            return self._generate_plus_population(fitness_values)
+
+        # The survivors are copied unchanged to the front of the next population, followed by the offspring.
+        order = _order(fitness_values, self.proportional)
+        if self.replacement == 'elitist':
+            survivors = order[len(order) - min(self.elite_count, len(order)):]
+            count = self.population_size - len(survivors)
+        else:
+            count = min(self.replace_count, len(order))
+            survivors = order[count:]
+        indices = self._select(fitness_values, size=count)
+        next_population = self._buffer((len(survivors) + len(indices), *self.current_population.shape[1:]), self.current_population.dtype)
+        np.take(self.current_population, survivors, axis=0, out=next_population[:len(survivors)])
+        np.take(self.current_population, indices, axis=0, out=next_population[len(survivors):])
+        offspring, offspring_fitness = self._apply_operators(next_population[len(survivors):], indices, count)
+        if offspring_fitness is None:
+            offspring_fitness = self._offspring_fitness(offspring, indices)
+        if not np.may_share_memory(offspring, next_population):
+            next_population = np.concatenate([next_population[:len(survivors)], offspring])
+        return (next_population, np.concatenate([fitness_values[survivors], offspring_fitness]))
+
+    def _generate_plus_population(self, fitness_values):
+        # The fittest individuals out of the parents and their offspring form the next generation, as in NSGA-II.
+        indices = self._select(fitness_values, size=self.population_size)
+        offspring = np.take(self.current_population, indices, axis=0)
+        offspring, offspring_fitness = self._apply_operators(offspring, indices, self.population_size)
+        if offspring_fitness is None:
+            offspring_fitness = self._offspring_fitness(offspring, indices)
+        candidates = np.concatenate([self.current_population, offspring])
+        candidate_fitness = np.concatenate([fitness_values, offspring_fitness])
+        survivors = _order(candidate_fitness, self.proportional)[len(candidates) - self.population_size:]
+        next_population = self._buffer((len(survivors), *candidates.shape[1:]), candidates.dtype)
+        np.take(candidates, survivors, axis=0, out=next_population)
+        return (next_population, candidate_fitness[survivors])
+
+    def _select(self, fitness_values, **kwargs):
+        # Calls the selection scheme and makes sure that it only returned indices of the current population.
+        indices = np.asarray(timed(self, 'selection', self.selection_scheme, fitness_values, self.proportional, rng=self.rng, **kwargs))
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self.current_population)):
+            raise ValueError(f"The selection scheme returned indices outside of the population of size {len(self.current_population)}.")
+        return indices
+
+    def _apply_operators(self, population, indices, size):
+        # Applies the genetic operators to the selected individuals. Their fitness values are known as long as
+        # only fitness operators (that update the values themselves) have been applied, otherwise None is returned.
+        fitness_values = np.asarray(self.current_fitness_values)[indices]
+        for index, operator in enumerate(self.genetic_operators):
+            if getattr(operator, 'uses_fitness', False):
+                if fitness_values is None:
+                    fitness_values = timed(self, 'fitness', self._fitness, population)
+                result = timed(self, f"operator {index}", operator, population, size, fitness_values, rng=self.rng)
+            else:
+                result = timed(self, f"operator {index}", operator, population, size, rng=self.rng)
+                fitness_values = None
+            if result is population:
+                continue
+            result = np.asarray(result)
+            if result.shape == population.shape:
+                population[...] = result
+            else:
+                population = result
+        return (population, fitness_values)
+
+    def _offspring_fitness(self, offspring, indices):
+        # Offspring that are identical to their parent keep its fitness value, only the others are evaluated.
+        if len(offspring) != len(indices):
+            return timed(self, 'fitness', self._fitness, offspring)
+        fitness_values = np.asarray(self.current_fitness_values)[indices]
+        fitness_values = fitness_values.astype(np.result_type(fitness_values, float))
+        parents = np.take(self.current_population, indices, axis=0)
+        changed = np.any((offspring != parents).reshape(len(offspring), -1), axis=1)
+        if changed.any():
+            fitness_values[changed] = timed(self, 'fitness', self._fitness, offspring[changed])
+        return fitness_values
+
+    def _buffer(self, shape, dtype):
+        # Returns whichever of the two population buffers does not hold the current population.
+        # The buffers are (re)allocated whenever the shape or type of the population changes.
+        if self._buffers is None or self._buffers[0].shape != shape or self._buffers[0].dtype != dtype:
+            self._buffers = [np.empty(shape, dtype=dtype), np.empty(shape, dtype=dtype)]
+        current = getattr(self, 'current_population', None)
+        if current is not None and np.may_share_memory(self._buffers[0], current):
+            return self._buffers[1]
+        return self._buffers[0]
 
     def _write_to_writer(self):
         if self.writer is not None:
-            self.writer.step(self)
-
-
-# Selection Methods:
-
-def cutoff_selection(population, f, proportional):
-    """ Simple and naive selection method that simply cuts of the lower half of the population ordered by fitness. """
-    selected = list(
-        sorted(population, key=f, reverse=not proportional
-        )[int(len(population)/2):])
-    new_pop = []
-    for i, _ in enumerate(population):
-        new_pop.append(selected[i%len(selected)])
-    return np.array(new_pop)
-
-
-def roulette_wheel_selection(population, f, proportional):
-    """ Implementation of the roulette wheel selection method. """
-    S = sum(map(f, population))
-    new_population = []
-    for _ in population:
-        alpha, iSum = random.uniform(0, S), 0
-        chosen = None
-        for individual2 in population:
-            iSum += f(individual2)
-            chosen = individual2
-            if iSum >= alpha:
-                break
-        new_population.append(chosen)
-    return np.array(new_population)
-
-
-def roulette_wheel_selection_orig(population, f, proportional):
-    """ Implementation of the roulette wheel selection method. """
-    S = sum(map(f, population))
-    new_population = []
-    for _ in population:
-        alpha, iSum = random.uniform(0, S), 0
-        chosen = None
-        for individual2 in population:
-            iSum += f(individual2)
-            chosen = individual2
-            if iSum >= alpha:
-                break
-        new_population.append(chosen)
-
-    return np.array(new_population)
+            timed(self, 'writer', self.writer.step, self)
+
+
+class FitnessCache:
+    """ Bounded memo cache for fitness values, keyed by the content of an individual. 
+        When the cache is full, the least recently used entry is evicted.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def evaluate(self, population, evaluate):
+        """ Returns the fitness values of the population. The individuals that are not cached yet 
+            are deduplicated and passed to evaluate at once, as a single array.
+        """
+        keys = [np.asarray(individual).tobytes() for individual in population]
+        found, missing = {}, {}
+        for index, key in enumerate(keys):
+            if key in self._values:
+                self._values.move_to_end(key)
+                found[key] = self._values[key]
+            elif key not in missing:
+                missing[key] = index
+        if missing:
+            new_values = evaluate(np.asarray(population)[list(missing.values())])
+            for key, value in zip(missing, new_values):
+                found[key] = self._values[key] = value
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return np.array([found[key] for key in keys])
+
+    def clear(self):
+        """ Removes all entries from the cache. """
+        self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
+
 
 # Genetic Operator Decorators:
+# A genetic operator is called with the population, the population size and the generator of the evolution as rng.
 
 def mutation_operator(m):
     """ Decorator that takes the mutation function f and turns it into a genetic operator. 
-        A mutation function is applied to each individual separately.
+        A mutation function is applied to each individual separately, with the generator as second argument. 
+        The results are written back into the population.
     """
-    def result(pop, pop_size):
-        return np.array(list(map(m, pop)))
+    def result(pop, pop_size, rng=None):
+        rng = np.random.default_rng(rng)
+        for i, individual in enumerate(pop):
+            pop[i] = m(individual, rng)
+        return pop
     return result
 
-def crossover_operator(f, sort=True, **kwargs):
-    """ Decorator that takes a function operating on two chromosomes and turns it into a proper genetic operator. 
-        It refills the selected population to the required population size. There is no sexual selection simulated, 
-        all surviving individuals are equally as likely to reproduce, no matter their respective fitness scores.
+def fitness_operator(f):
+    """ Decorator for genetic operators that keep the fitness values up to date themselves, e.g. by computing 
+        the change in fitness caused by a mutation. Such an operator is called with the population, the population size,
+        the fitness values of the population, which it has to update in place, and the generator. If an evolution only uses fitness
+        operators, the next generation does not have to be evaluated at all.
     """
-    def result(sorted_population, population_size):
-        population = sorted_population
-        new_population = []
-        if not sort: 
-            random.shuffle(population)
+    f.uses_fitness = True
+    return f
+
+def perturbation_operator(distribution, low, high, probability=1.0):
+    """ Returns a vectorized mutation operator for real-valued genomes of any dimension. Each gene is perturbed
+        (with the given probability) by a value drawn from the distribution and then clipped into [low, high].
+        The bounds can be scalars or arrays with one value per gene. The whole population is changed in place.
+    """
+    def result(pop, pop_size, rng=None):
+        rng = np.random.default_rng(rng)
+        noise = distribution(pop.shape, rng)
+        if probability < 1:
+            noise *= rng.random(pop.shape) < probability
+        pop += noise
+        np.clip(pop, low, high, out=pop)
+        return pop
+    return result
+
+def crossover_operator(f, probability=1.0):
+    """ Decorator that takes a crossover function and turns it into a proper genetic operator. The crossover function
+        receives two arrays with a batch of parents each (one parent per row) and the generator, and returns an array with one child per pair.
+        Every individual is replaced by a child of itself and a randomly chosen mate with the given probability. 
+        If the selected population is smaller than the population size, it is refilled to the required size. There is no 
+        sexual selection simulated, all surviving individuals are equally as likely to reproduce, no matter their respective fitness scores.
+    """
+    def result(population, population_size, rng=None):
+        rng = np.random.default_rng(rng)
         length = len(population)
-        for i in range(population_size):
-            new_population.append(f(i%length, (i+1)%length)) 
-    return result
\ No newline at end of file
+        if length != population_size:
+            population = population[np.arange(population_size) % length]
+        mates = rng.integers(0, length, population_size)
+        crossing = np.flatnonzero(rng.random(population_size) < probability)
+        if len(crossing):
+            population[crossing] = f(population[crossing], population[mates[crossing]], rng)
+        return population
+    return result
@@ -1,14 +1,12 @@
-import math
 import csv
-import random
+import hashlib
+import inspect
+import os
 
 import numpy as np
 
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import cm, colors, ticker, style
-
-from .evolution import Evolution, mutation_operator, crossover_operator, cutoff_selection, roulette_wheel_selection
+from .evolutionnd import EvolutionND
+from .distributions import to_distribution
 
 class Evolution2DSettings:
     def __init__(self, distribution, population_size, mutation_probability):
@@ -20,37 +18,70 @@ class Evolution2DSettings:
         return super().__repr__() + f""
 
 
-class Evolution2D(Evolution):
-    """ Evolution2D is a wrapper for the Evolution class that allows the creation of an evolutionary algorithm for 2 dimensional functions. """
-    def __init__ (self, function, settings, value_range, value_step, writer=None):
-        self.function = function
+class Evolution2D(EvolutionND):
+    """ Evolution2D is a wrapper for the Evolution class that allows the creation of an evolutionary algorithm for 2 dimensional functions. 
+        Both dimensions share the same value range. 
+    """
+    def __init__ (self, function, settings, value_range, value_step, writer=None, vectorized=False, **kwargs):
+        """ If vectorized is set, the function is expected to also accept a whole population of shape (n, 2) and 
+            return the n fitness values at once, which allows the evaluation to be done in a single call.
+            Further keyword arguments (e.g. seed or executor) are passed on to Evolution.
+        """
         self.settings = settings
         self.value_range = value_range
         self.value_step = value_step
-        super().__init__(self.settings.population_size, self._random, self.function, cutoff_selection, [self._mutate2d], writer=writer)
-        
-    def _random (self):
-        """ Returns a random point within the value range. """
-        return np.array([random.uniform(self.value_range[0], self.value_range[1]), random.uniform(self.value_range[0], self.value_range[1])])
-
-    def create_values(self):
-        """ Creates and returns a tuple (X, Y, Z) of values. While X and Y are created based on the value range and step properties, Z is created by computing f([x, y])."""
+        super().__init__(function, [value_range, value_range], self.settings.population_size, self.settings.distribution, 
+            proportional=True, writer=writer, vectorized=vectorized, **kwargs)
+
+    def create_values(self, cache_dir=None, chunk_size=2**16):
+        """ Creates and returns a tuple (X, Y, Z) of values. While X and Y are created based on the value range and step properties, Z is created by computing f([x, y]).
+            The grid is evaluated in chunks of chunk_size points, in a single call per chunk if the function is vectorized, otherwise through 
+            the executor of the evolution. If cache_dir is given, Z is stored there and reused for the same function, value range and step.
+            Only plain functions defined at module level are cached, other callables (e.g. partials, bound methods or
+            instances of classes) are always evaluated.
+        """
         X = np.arange(self.value_range[0], self.value_range[1], self.value_step)
         Y = np.arange(self.value_range[0], self.value_range[1], self.value_step)
-        Z = np.zeros((len(X), len(Y)))
-        for ix, x in enumerate(X):
-            for iy, y in enumerate(Y):
-                Z[ix][iy] = self.function(np.array([x, y]))
+        path = _surface_path(cache_dir, self.function, self.value_range, self.value_step)
+        if path is not None and os.path.exists(path):
+            return (X, Y, np.load(path))
+        points = np.stack(np.meshgrid(X, Y, indexing='ij'), axis=-1).reshape(-1, 2)
+        Z = np.concatenate([self._evaluate(points[start:start + chunk_size]) for start in range(0, len(points), chunk_size)])
+        Z = Z.reshape(len(X), len(Y))
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, Z)
         return (X, Y, Z)
 
-    def _mutate2d(self, population, population_size):
-        """ Returns a point that is clamped in the range but slightly mutated, between -mutation_max_step and mutation_max_step. """
-        new_pop = []
-        for individual in population:
-            x = min(max(individual[0] + self.settings.distribution(), self.value_range[0]), self.value_range[1])
-            y = min(max(individual[1] + self.settings.distribution(), self.value_range[0]), self.value_range[1])
-            new_pop.append(np.array([x, y]))
-        return np.array(new_pop)
+def _surface_path(cache_dir, function, value_range, value_step):
+    # Surfaces are cached by the qualified name, the code and the default arguments of the function, so editing the function
+    # invalidates its surface. Changes to the functions it calls are not detected, the cache directory has to be cleared by hand then.
+    # Other callables and functions with a closure (lambdas, local and decorated functions) can hold state that is not part
+    # of the key and are not cached.
+    if cache_dir is None or not inspect.isfunction(function) or function.__closure__ is not None:
+        return None
+    name = f"{function.__module__}.{function.__qualname__}"
+    if '<' in name:
+        return None
+    defaults = (function.__defaults__, function.__kwdefaults__)
+    key = hashlib.sha1(repr((name, _code_digest(function.__code__), _value_digest(defaults), tuple(map(float, value_range)), 
+        float(value_step))).encode()).hexdigest()
+    return os.path.join(cache_dir, f"surface-{key}.npy")
+
+def _code_digest(code):
+    # The repr of nested code objects contains their address, so they are digested recursively instead.
+    constants = [_code_digest(constant) if isinstance(constant, type(code)) else repr(constant) for constant in code.co_consts]
+    return hashlib.sha1(repr((code.co_code, constants, code.co_names)).encode()).hexdigest()
+
+def _value_digest(value):
+    # The repr of large arrays is abbreviated, so their content is digested instead.
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, (tuple, list)):
+        return tuple(map(_value_digest, value))
+    if isinstance(value, dict):
+        return tuple((key, _value_digest(item)) for key, item in sorted(value.items()))
+    return repr(value)
 
 # IO Helper Functions:
 
@@ -64,42 +95,29 @@ def settings2d_from_file(path):
             settings.append(Evolution2DSettings(to_distribution(row[0]), int(row[1]), float(row[2])))
     return settings 
 
-def to_distribution(string):
-    class distribution:
-        def __init__(self):   
-            self.distribution_dict = {
-                'uniform' : self.uniform,
-                'normal' : self.normal,
-            }
-
-        def uniform(self, step):
-            return lambda: random.uniform(-step, step)
-
-        def normal(self, sigma):
-            return lambda: random.normalvariate(0, sigma)
-    distributions = distribution()
-    split = string.split(' ')
-    dist, value = split
-    value = float(value)
-    return distributions.distribution_dict[dist](value)
-    
-
 # Example Functions:
+# All example functions are vectorized: they accept a single individual of shape (2,)
+# as well as a whole population of shape (n, 2), in which case n values are returned.
 
 def sine(individual):
     """ Sine function using the sum of sin(x) and sin(y). The result is then multiplied by xy to create a falloff as xy approaches 0. """ 
-    x, y = individual    
-    value = (2 + math.sin(x) + math.sin(y)) * x * y
-    return max(0, value)
+    x, y = _unpack(individual)
+    value = (2 + np.sin(x) + np.sin(y)) * x * y
+    return np.maximum(0, value)
 
 def parabola(individual):
     """ Parabola function of x squared plus y squared.  """
-    x, y = individual
+    x, y = _unpack(individual)
     return x*x + y*y
 
 def exp(individual):
-    x, y = individual
-    return math.sin(x) * y * x
+    x, y = _unpack(individual)
+    return np.sin(x) * y * x
+
+def _unpack(individual):
+    # Splits a single individual or a population into its x and y components.
+    individual = np.asarray(individual)
+    return individual[..., 0], individual[..., 1]
 
 function_dict = {
     'sine' : sine,
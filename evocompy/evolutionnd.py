@@ -0,0 +1,81 @@
+import numpy as np
+
+from .evolution import Evolution, crossover_operator, perturbation_operator
+from .selection import cutoff_selection
+
+class EvolutionND(Evolution):
+    """ EvolutionND is a wrapper for the Evolution class for real-valued functions of any number of dimensions.
+        bounds is a sequence with one (min, max) pair per dimension. The initial population is drawn uniformly
+        within the bounds, mutation perturbs all genes at once by values drawn from the distribution.
+    """
+    def __init__(self, function, bounds, population_size, distribution, selection_scheme=cutoff_selection, proportional=False, 
+            mutation_probability=1.0, writer=None, vectorized=True, crossover=None, crossover_probability=1.0, **kwargs):
+        """ If vectorized is set, the function is expected to accept a whole population of shape (n, dimensions)
+            and return the n fitness values at once. If a crossover function (e.g. from crossover.py) is given, 
+            it is applied before the mutation. Further keyword arguments are passed on to Evolution.
+        """
+        self.function = function
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.low, self.high = self.bounds[:, 0], self.bounds[:, 1]
+        self.dimensions = len(self.bounds)
+        self.distribution = distribution
+        self.vectorized = vectorized
+        operators = [perturbation_operator(self.distribution, self.low, self.high, mutation_probability)]
+        if crossover is not None:
+            operators.insert(0, crossover_operator(crossover, crossover_probability))
+        super().__init__(population_size, self._random, self.function, selection_scheme, operators, proportional=proportional, writer=writer,
+            batch_fitness_function=self.function if vectorized else None, batch_random_function=self._random_population, **kwargs)
+
+    def _random(self, rng):
+        """ Returns a random point within the bounds. """
+        return rng.uniform(self.low, self.high)
+
+    def _random_population(self, size, rng):
+        """ Returns size random points within the bounds. """
+        return rng.uniform(self.low, self.high, (size, self.dimensions))
+
+def uniform_bounds(value_range, dimensions):
+    """ Returns bounds that use the same (min, max) value range for each of the dimensions. """
+    return np.tile(np.asarray(value_range, dtype=float), (dimensions, 1))
+
+# Benchmark Functions:
+# Standard benchmark functions for minimization, defined for any number of dimensions. Like the example functions
+# of evolution2d.py they accept a single individual as well as a whole population of shape (n, dimensions).
+# All of them have their global minimum of 0 at the origin, except for rosenbrock which has it at (1, ..., 1).
+
+def sphere(individual):
+    """ Sum of the squares of all coordinates. """
+    individual = np.asarray(individual)
+    return np.sum(individual**2, axis=-1)
+
+def rastrigin(individual):
+    """ Highly multimodal function with a regular grid of local minima. """
+    individual = np.asarray(individual)
+    return 10 * individual.shape[-1] + np.sum(individual**2 - 10 * np.cos(2 * np.pi * individual), axis=-1)
+
+def rosenbrock(individual):
+    """ Unimodal function whose minimum lies in a long, narrow, curved valley. """
+    individual = np.asarray(individual)
+    x, y = individual[..., :-1], individual[..., 1:]
+    return np.sum(100 * (y - x**2)**2 + (1 - x)**2, axis=-1)
+
+def ackley(individual):
+    """ Nearly flat outer region with many local minima and a single deep hole at the origin. """
+    individual = np.asarray(individual)
+    return (-20 * np.exp(-0.2 * np.sqrt(np.mean(individual**2, axis=-1))) 
+        - np.exp(np.mean(np.cos(2 * np.pi * individual), axis=-1)) + 20 + np.e)
+
+function_dict = {
+    'sphere': sphere,
+    'rastrigin': rastrigin,
+    'rosenbrock': rosenbrock,
+    'ackley': ackley,
+}
+
+# The value ranges in which the benchmark functions are commonly evaluated.
+range_dict = {
+    'sphere': (-5.12, 5.12),
+    'rastrigin': (-5.12, 5.12),
+    'rosenbrock': (-2.048, 2.048),
+    'ackley': (-32.768, 32.768),
+}
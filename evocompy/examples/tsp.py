@@ -3,16 +3,13 @@ Usage:
     tsp.py <nodecount> <popsize> <mprob> <mnum> <outputfile>
 """
 import csv
-import random
     
-import docopt
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.collections import PathCollection
 
 
-from ..evolution import Evolution, mutation_operator, cutoff_selection
-from ..view import View
+from ..evolution import Evolution, mutation_operator, crossover_operator, fitness_operator
+from ..crossover import order_crossover
+from ..selection import cutoff_selection
 from ..io import CSVWriter
 
 
@@ -23,17 +20,19 @@ class TSP:
     """ Implementation of the traveling salesperson problem. 
         A Solution is given as an array of indices corresponding to the nodes array indices.
     """
-    def __init__(self, nodecount, coordinate_range=1):
+    def __init__(self, nodecount, coordinate_range=1, seed=None):
         self.nodecount = nodecount
         self.coordinate_range = coordinate_range
-        self.nodes = self._generate_nodes(nodecount)
+        self.nodes = self._generate_nodes(np.random.default_rng(seed))
         self.distances = self._generate_distances()        
 
-    def random_solution(self):
+    def random_solution(self, rng=None):
         """ Returns a uniformly randomized solution for the tsp. """ 
-        solution = np.arange(self.nodecount)
-        np.random.shuffle(solution)
-        return solution
+        return np.random.default_rng(rng).permutation(self.nodecount)
+
+    def random_population(self, size, rng=None):
+        """ Returns size uniformly randomized solutions at once. """
+        return np.random.default_rng(rng).permuted(np.tile(np.arange(self.nodecount), (size, 1)), axis=1)
 
     def get_distance(self, n1, n2):
         """ Returns the cost of a potential edge of the graph. Utilizes the underlying representation of the cost matrix as a dictionary. """
@@ -41,11 +40,12 @@ class TSP:
 
     def solution_cost(self, solution):
         """ Calculates the sum of all edges traversed in the given solution. """
-        cost = 0
-        for i in range(len(solution)):
-            dist = self.get_distance(solution[i], solution[(i+1)%len(solution)])
-            cost += dist  
-        return cost
+        return self.distances[solution, np.roll(solution, -1)].sum()
+
+    def population_cost(self, population):
+        """ Vectorized version of solution_cost, that computes the cost of every solution (row) of the population at once. """
+        population = np.asarray(population)
+        return self.distances[population, np.roll(population, -1, axis=1)].sum(axis=1)
 
     def save_csv(self, filename):
         """ Serializes the TSP into a csv file. """
@@ -54,27 +54,13 @@ class TSP:
     def load_csv(self, filename):
         """ Deserializes a TSP from a given csv file. """
 
-    def _generate_nodes(self, edge):
-        nodes = []
-        for _ in range(self.nodecount):
-            nodes.append(np.array([
-                    random.random() * self.coordinate_range,         
-                    random.random() * self.coordinate_range
-                ]))
-        return nodes
+    def _generate_nodes(self, rng):
+        return rng.random((self.nodecount, 2)) * self.coordinate_range
 
     def _generate_distances(self):
-        distances = np.zeros((self.nodecount, self.nodecount))
-        for x, n1 in enumerate(self.nodes):
-            for y, n2 in enumerate(self.nodes):
-                distances[x, y] = self._distance(n1, n2)
-        return distances
-
-    @staticmethod
-    def _distance(p1, p2):
-        # Compute euclidian distance between the two given inputs.
-        p1, p2 = np.array(p1), np.array(p2)
-        return np.linalg.norm(p1-p2)
+        # Compute the euclidian distances between all pairs of nodes at once.
+        differences = self.nodes[:, np.newaxis, :] - self.nodes[np.newaxis, :, :]
+        return np.sqrt(np.sum(differences**2, axis=-1))
 
     def __str__(self):
         return self.__repr__()
@@ -84,56 +70,111 @@ class TSP:
 
 def tsp_mutate(probability, amount):
     @mutation_operator
-    def result (solution):
+    def result (solution, rng):
         mutated = solution
-        for i in range(amount):
-            if random.random() < probability:
-                i = random.randint(0, len(solution)-1)
-                j = random.randint(0, len(solution)-1)
-                solution[[i, j]] = solution[[j, i]]
+        swaps = rng.integers(0, len(solution), (amount, 2))[rng.random(amount) < probability]
+        for i, j in swaps:
+            solution[[i, j]] = solution[[j, i]]
         return mutated
     return result
 
-def get_evolution(tsp, pop_size, output_fp, mutation_probability, mutation_number):
-    """ Helper function that creates a TSP-evolution based on some given settings. """
+def tsp_swap_mutate(tsp, probability, amount):
+    """ Vectorized version of tsp_mutate. Each of the amount attempts swaps two random nodes of every solution with the given probability.
+        The cost of the solutions is updated by the change in length of the (at most four) affected edges instead of recomputing the tour.
+    """
+    @fitness_operator
+    def result(population, population_size, costs, rng=None):
+        rng = np.random.default_rng(rng)
+        rows = np.arange(len(population))
+        n = population.shape[1]
+        for _ in range(amount):
+            active = rng.random(len(population)) < probability
+            i, j = rng.integers(0, n, (2, len(population)))
+            j = np.where(active, j, i)
+            # Edge k connects the nodes at positions k and k+1. Edges that are affected twice (adjacent positions) are only counted once.
+            edges = np.stack([i - 1, i, j - 1, j], axis=1) % n
+            unique = ~np.any(np.tril(edges[:, :, np.newaxis] == edges[:, np.newaxis, :], -1), axis=2)
+            before = _edge_costs(tsp, population, edges, unique)
+            population[rows, i], population[rows, j] = population[rows, j], population[rows, i]
+            costs += _edge_costs(tsp, population, edges, unique) - before
+        return population
+    return result
+
+def tsp_two_opt_mutate(tsp, probability, amount):
+    """ 2-opt mutation: each of the amount attempts reverses a random segment of every solution with the given probability.
+        Only the two edges at the ends of the segment change, so the cost is updated in O(1) per solution.
+    """
+    @fitness_operator
+    def result(population, population_size, costs, rng=None):
+        rng = np.random.default_rng(rng)
+        rows = np.arange(len(population))
+        n = population.shape[1]
+        positions = np.arange(n)
+        for _ in range(amount):
+            active = rng.random(len(population)) < probability
+            a, b = rng.integers(0, n, (2, len(population)))
+            i, j = np.minimum(a, b), np.where(active, np.maximum(a, b), np.minimum(a, b))
+            # Reversing the whole tour (or a single node) does not change the cycle.
+            changed = (j > i) & (j - i < n - 1)
+            before, after = population[rows, (i - 1) % n], population[rows, (j + 1) % n]
+            first, last = population[rows, i], population[rows, j]
+            delta = tsp.distances[before, last] + tsp.distances[first, after] - tsp.distances[before, first] - tsp.distances[last, after]
+            costs += np.where(changed, delta, 0)
+            inside = (positions >= i[:, np.newaxis]) & (positions <= j[:, np.newaxis]) & changed[:, np.newaxis]
+            order = np.where(inside, i[:, np.newaxis] + j[:, np.newaxis] - positions, positions)
+            population[...] = np.take_along_axis(population, order, axis=1)
+        return population
+    return result
+
+def _edge_costs(tsp, population, edges, mask):
+    # Sums the costs of the given edges (positions in the tours) of every solution, ignoring those where mask is False.
+    rows = np.arange(len(population))[:, np.newaxis]
+    n = population.shape[1]
+    return np.sum(tsp.distances[population[rows, edges], population[rows, (edges + 1) % n]] * mask, axis=1)
+
+def get_evolution(tsp, pop_size, output_fp, mutation_probability, mutation_number, crossover_probability=0.0):
+    """ Helper function that creates a TSP-evolution based on some given settings. With a crossover probability, 
+        offspring is created with the order crossover before it is mutated.
+    """
     headers = ['fittest', 'mean', 'median']
-    formatter = lambda evolution: [round(evolution.get_fittest_individual()[1], DIGITS), round(evolution.get_mean_fitness(), DIGITS), round(evolution.get_median_fitness(), DIGITS)]
+    formatter = lambda evolution: [round(evolution.get_best_fitness(), DIGITS), round(evolution.get_mean_fitness(), DIGITS), round(evolution.get_median_fitness(), DIGITS)]
 
-    evolution = Evolution(pop_size, tsp.random_solution, tsp.solution_cost, cutoff_selection, [tsp_mutate(mutation_probability, mutation_number)], proportional=False, writer=CSVWriter(output_fp, formatter, headers))
+    operators = [tsp_swap_mutate(tsp, mutation_probability, mutation_number)]
+    if crossover_probability > 0:
+        operators.insert(0, crossover_operator(order_crossover, crossover_probability))
+    evolution = Evolution(pop_size, tsp.random_solution, tsp.solution_cost, cutoff_selection, operators, proportional=False, writer=CSVWriter(output_fp, formatter, headers), 
+        batch_fitness_function=tsp.population_cost, batch_random_function=tsp.random_population)
     return evolution
 
 class TSPAnimation:
     def __init__(self, tsp, evolution):
         self.tsp = tsp
         self.evolution = evolution
-        self.lines = None
+        self.line = None
         self.text = None
 
-    def update(self, evolution, ax, fig, i):
-        # cleanup
-        if self.lines is not None:
-            for line in self.lines:
-                line.remove()
-        if self.text is not None:
-            self.text.remove()
-        fittest, fitness = evolution.get_fittest_individual()
-        self.text = fig.text(0.125, 0.025, f"generation: {evolution.generation}; fitness: {fitness}")
-        print(f"{evolution.generation} : {fitness}")
+    def update(self, snapshot, ax, fig, i):
+        fittest, fitness = snapshot.get_fittest_individual()
+        self.text.set_text(f"generation: {snapshot.generation}; fitness: {fitness}")
+        print(f"{snapshot.generation} : {fitness}")
 
         # The first element of the list has to be appended at the end again, so that it entails the full hamilton cycle.
         fittest_cycle = np.append(fittest, [fittest[0]], axis=0)
-        fittest_cycle = np.array([self.tsp.nodes[index] for index in fittest_cycle]) # Convert indices to actual nodes. 
-        X, Y = fittest_cycle.T
-        self.lines = ax.plot(X, Y, c=COLOR)
-        evolution.step()
-        
+        X, Y = self.tsp.nodes[fittest_cycle].T # Convert indices to actual nodes. 
+        self.line.set_data(X, Y)
+        return [self.line, self.text]
 
     def setup(self, evolution, ax, figure):
-        ax.scatter(*list(zip(*self.tsp.nodes)))
+        ax.scatter(*self.tsp.nodes.T)
+        # The line and the text are created once and updated in every frame.
+        self.line, = ax.plot([], [], c=COLOR)
+        self.text = figure.text(0.125, 0.025, "")
 
 
 if __name__ == '__main__':
-    arguments = docopt.docopt(__doc__)
+    from docopt import docopt
+    from ..view import View
+    arguments = docopt(__doc__)
     tsp = TSP(int(arguments['<nodecount>']))
     evolution = get_evolution(tsp, int(arguments['<popsize>']), arguments['<outputfile>'], float(arguments['<mprob>'])/100, int(arguments['<mnum>']))
     animation = TSPAnimation(tsp, evolution)
@@ -22,9 +22,8 @@ from docopt import docopt
 sys.path.append('..')
 
 from .evolution2d import Evolution2D, settings2d_from_file, function_dict
-from .view import View2D
 from .io import CSVWriter, HistoryWriter
-from .benchmark import Benchmark, condition_generation
+from .benchmark import ParallelBenchmark, condition_generation
 
 DIGITS = 2
 
@@ -32,11 +31,13 @@ if __name__ == '__main__':
     arguments = docopt(__doc__, version='1.0.0')
     
     function = lambda x: 0
+    vectorized = False
     settings = []
     interval = 50
 
     if arguments['<function-name>'] and arguments['<function-name>'] in function_dict:
         function = function_dict[arguments['<function-name>']]
+        vectorized = True
     
     if arguments['--from-file'] or arguments['-f']:
         # TODO: This try/except block is boilerplate code.
@@ -56,7 +57,7 @@ if __name__ == '__main__':
     layout = (size, size)
 
     headers = ['fittest', 'mean', 'median']
-    formatter = lambda evolution: [round(evolution.get_fittest_individual()[1], DIGITS), round(evolution.get_mean_fitness(), DIGITS), round(evolution.get_median_fitness(), DIGITS)]
+    formatter = lambda evolution: [round(evolution.get_best_fitness(), DIGITS), round(evolution.get_mean_fitness(), DIGITS), round(evolution.get_median_fitness(), DIGITS)]
 
     if arguments['-b'] or arguments['--benchmark']:
         generations = 0
@@ -68,10 +69,12 @@ if __name__ == '__main__':
 
         evolutions = []
         for i, setting in enumerate(settings):
-            evolutions.append(Evolution2D(function, setting, value_range, step, writer=CSVWriter(f"{arguments['<namepattern>']}{i}.csv", formatter, headers)))
-        benchmark = Benchmark(evolutions, condition_generation(generations))
+            evolutions.append(Evolution2D(function, setting, value_range, step, writer=CSVWriter(f"{arguments['<namepattern>']}{i}.csv", formatter, headers), vectorized=vectorized))
+        benchmark = ParallelBenchmark(evolutions, condition_generation(generations))
         benchmark.run()
 
     else: 
-        view = View2D(function, layout, settings, value_range, step, interval=interval, writer=CSVWriter('functions.csv', formatter, headers))
+        # The view is only imported here, so that benchmarks run without loading matplotlib.
+        from .view import View2D
+        view = View2D(function, layout, settings, value_range, step, interval=interval, writer=CSVWriter('functions.csv', formatter, headers), vectorized=vectorized)
         view.run()
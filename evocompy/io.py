@@ -1,8 +1,13 @@
 import csv
+import glob
 import json
+import os
+import time
 
 import numpy as np
 
+from .multiobjective import pareto_front, crowding_distance
+
 class _NumpyEncoder(json.JSONEncoder):
     # Small helper class for encoding numpy arrays into JSON.
     def default(self, obj):
@@ -25,38 +30,399 @@ class History:
         with open(self.filepath, mode='w', encoding='utf-8') as f:
             json.dump(self.generations, f, cls=_NumpyEncoder)
 
-class CSVWriter:
-    """ Implements a writer class that can write information about an Evolution into a csv file. """
-    def __init__(self, filepath, format_function, headers, delimiter=','):
-        self.filepath = filepath
+class MemmapHistory:
+    """ History that streams the population and fitness values of every generation into memory-mapped .npy files
+        inside of directory, so that the memory usage does not grow with the number of generations. The files are 
+        preallocated in chunks of chunk_size generations. Any generation k can be accessed through history[k] without
+        loading the rest of the run. Opening an existing directory continues (or replays) the stored history.
+    """
+    def __init__(self, directory, chunk_size=100):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.shape = None
+        self.fitness_shape = None
+        self.dtypes = None
+        self._chunks = {}
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._path('meta.json')):
+            with open(self._path('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            self.count, self.chunk_size = meta['count'], meta['chunk_size']
+            self.shape, self.dtypes = meta['shape'] and tuple(meta['shape']), meta['dtypes']
+            # Histories written before the fitness shape was stored only hold one fitness value per individual.
+            fitness_shape = meta.get('fitness_shape', self.shape and self.shape[:1])
+            self.fitness_shape = fitness_shape and tuple(fitness_shape)
+
+    def append(self, population, fitness_values):
+        """ Appends a generation to the history. """
+        population, fitness_values = np.asarray(population), np.asarray(fitness_values)
+        if self.shape is None:
+            self.shape = population.shape
+            self.fitness_shape = fitness_values.shape
+            self.dtypes = [population.dtype.str, fitness_values.dtype.str]
+        elif population.shape != self.shape:
+            raise ValueError(f"Population of shape {population.shape} does not fit a history of shape {self.shape}.")
+        elif fitness_values.shape != self.fitness_shape:
+            raise ValueError(f"Fitness values of shape {fitness_values.shape} do not fit a history of shape {self.fitness_shape}.")
+        chunk, row = divmod(self.count, self.chunk_size)
+        populations, fitness = self._chunk(chunk, writable=True)
+        populations[row] = population
+        fitness[row] = fitness_values
+        self.count += 1
+
+    def flush(self):
+        """ Flushes the memory maps and writes the metadata that is needed to reopen the history. """
+        for populations, fitness in self._chunks.values():
+            if populations.mode != 'r':
+                populations.flush()
+                fitness.flush()
+        with open(self._path('meta.json'), mode='w', encoding='utf-8') as f:
+            json.dump({'count': self.count, 'chunk_size': self.chunk_size, 'shape': self.shape, 'fitness_shape': self.fitness_shape, 
+                'dtypes': self.dtypes}, f)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        """ Returns a 2-tuple with the (read-only) population and fitness values of the k-th recorded generation. """
+        if k < 0:
+            k += self.count
+        if not 0 <= k < self.count:
+            raise IndexError(f"Generation {k} is not in the history.")
+        chunk, row = divmod(k, self.chunk_size)
+        populations, fitness = self._chunk(chunk)
+        return (populations[row], fitness[row])
+
+    def __iter__(self):
+        for k in range(self.count):
+            yield self[k]
+
+    def _chunk(self, chunk, writable=False):
+        # Only the chunk that is currently written to is kept open for writing, older chunks are reopened read-only.
+        if chunk in self._chunks and (not writable or self._chunks[chunk][0].mode != 'r'):
+            return self._chunks[chunk]
+        paths = (self._path(f"population.{chunk:05d}.npy"), self._path(f"fitness.{chunk:05d}.npy"))
+        if writable:
+            self.flush()
+            self._chunks.clear()
+            if os.path.exists(paths[0]):
+                maps = tuple(np.load(path, mmap_mode='r+') for path in paths)
+            else:
+                maps = (np.lib.format.open_memmap(paths[0], mode='w+', dtype=np.dtype(self.dtypes[0]), shape=(self.chunk_size, *self.shape)),
+                    np.lib.format.open_memmap(paths[1], mode='w+', dtype=np.dtype(self.dtypes[1]), shape=(self.chunk_size, *self.fitness_shape)))
+        else:
+            maps = tuple(np.load(path, mmap_mode='r') for path in paths)
+        self._chunks[chunk] = maps
+        return maps
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+class Checkpointer:
+    """ Writes a checkpoint of an evolution into directory every interval generations, keeping the latest keep checkpoints.
+        Pass it to an Evolution as checkpointer, or use resume to continue an evolution from the latest checkpoint.
+    """
+    def __init__(self, directory, interval=100, keep=2):
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        os.makedirs(self.directory, exist_ok=True)
+
+    def step(self, evolution):
+        """ Writes a checkpoint if the generation of the evolution is a multiple of the interval. """
+        if evolution.generation % self.interval == 0:
+            self.save(evolution)
+
+    def save(self, evolution):
+        """ Writes a checkpoint of the evolution and removes the ones that are no longer kept. """
+        evolution.save_checkpoint(os.path.join(self.directory, f"checkpoint-{evolution.generation:010d}.npz"))
+        for path in self.checkpoints()[:-self.keep]:
+            os.remove(path)
+
+    def checkpoints(self):
+        """ Returns the paths of all checkpoints, from the oldest to the latest. """
+        return sorted(glob.glob(os.path.join(glob.escape(self.directory), "checkpoint-[0-9]*.npz")))
+
+    def resume(self, evolution):
+        """ Loads the latest checkpoint into the evolution. Returns False if there is none. """
+        checkpoints = self.checkpoints()
+        if not checkpoints:
+            return False
+        evolution.load_checkpoint(checkpoints[-1])
+        return True
+
+class _BufferedWriter:
+    # Base class for writers that collect rows in a buffer, which is written out once it holds buffer_size rows,
+    # once flush_interval seconds have passed since the last write, and when the writer is finalized.
+    def __init__(self, format_function, headers, buffer_size, flush_interval):
         self.format_function = format_function
         self.headers = headers
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._last_flush = time.monotonic()
+
+    def step(self, evolution):
+        """ Adds the next row to the buffer and flushes it if one of the thresholds is reached. """
+        self._rows.append(self.format_function(evolution))
+        self._flush_if_due()
+
+    def flush(self):
+        """ Writes all buffered rows. """
+        if self._rows:
+            self._write_rows(self._rows)
+            self._rows = []
+        self._last_flush = time.monotonic()
+
+    def collect(self):
+        """ Returns the rows that are still buffered, so that they can be sent back from a worker process. """
+        return self._rows
+
+    def restore(self, rows):
+        """ Replaces the buffer with the one of a copy of this writer in a worker process. Rows buffered
+            before the worker was forked have already been written by the worker.
+        """
+        self._rows = rows
+
+    def _flush_if_due(self):
+        if len(self._rows) >= self.buffer_size or (self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def _write_rows(self, rows):
+        raise NotImplementedError
+
+class CSVWriter(_BufferedWriter):
+    """ Implements a writer class that can write information about an Evolution into a csv file. 
+        The file is kept open and rows are written in batches, see buffer_size and flush_interval.
+        With append set, an existing file is continued instead of overwritten, e.g. when resuming from a checkpoint.
+    """
+    def __init__(self, filepath, format_function, headers, delimiter=',', buffer_size=100, flush_interval=5.0, append=False):
+        super().__init__(format_function, headers, buffer_size, flush_interval)
+        self.filepath = filepath
         self.delimiter = delimiter
-        with open(self.filepath, mode='w', newline='') as f:
-            writer = csv.writer(f, delimiter=self.delimiter)
-            writer.writerow(headers)
+        if append and os.path.exists(self.filepath):
+            self._file = open(self.filepath, mode='a', newline='')
+        else:
+            self._file = open(self.filepath, mode='w', newline='')
+            csv.writer(self._file, delimiter=self.delimiter).writerow(headers)
+            self._file.flush()
+
+    def finalize(self):
+        """ Writes the remaining rows and closes the file. """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_rows(self, rows):
+        if self._file is None:
+            self._file = open(self.filepath, mode='a', newline='')
+        csv.writer(self._file, delimiter=self.delimiter).writerows(rows)
+        self._file.flush()
+
+class ProfileWriter(CSVWriter):
+    """ Writes the stats of an Evolution created with profile set into a csv file, with one row per generation and stage.
+        Generation 0 is the initial population. A generation is written once all of its stages are recorded,
+        i.e. in the step of the next generation or when the writer is finalized.
+    """
+    def __init__(self, filepath, delimiter=',', buffer_size=100, flush_interval=5.0, append=False):
+        super().__init__(filepath, None, ['generation', 'stage', 'seconds', 'calls', 'evaluations'], delimiter=delimiter, 
+            buffer_size=buffer_size, flush_interval=flush_interval, append=append)
+        self._generation = None
+        self._pending = None
 
     def step(self, evolution):
-        """ Appends the next line to the csv. """
-        with open(self.filepath, mode='a', newline='') as f:
-            writer = csv.writer(f, delimiter=self.delimiter)
-            writer.writerow(self.format_function(evolution))
-            
+        """ Adds the rows of the previous generation to the buffer. """
+        if evolution.stats is None:
+            return
+        if self._generation is None:
+            self._generation = evolution.generation
+        self._add_pending()
+        # The records of the current generation are still being filled, they are kept by reference until the next step.
+        self._pending = (self._generation, evolution.stats.current())
+        self._generation += 1
+        self._flush_if_due()
+
+    def finalize(self):
+        """ Writes the remaining rows, including those of the last generation, and closes the file. """
+        self._add_pending()
+        super().finalize()
+
+    def _add_pending(self):
+        if self._pending is not None:
+            generation, records = self._pending
+            self._rows.extend([generation, stage, record.seconds, record.calls, record.evaluations] for stage, record in records.items())
+            self._pending = None
+
+class AverageCSVWriter(CSVWriter):
+    """ Writes statistics over the replicas of an AverageEvolution into a csv file. Every row holds the generation and,
+        for the best, mean and median fitness, their mean over the replicas and the half width of its confidence interval
+        (z times the standard error, 1.96 gives the 95% interval of a normal distribution).
+    """
+    def __init__(self, filepath, z=1.96, delimiter=',', buffer_size=100, flush_interval=5.0, append=False):
+        headers = ['generation']
+        for name in ('fittest', 'mean', 'median'):
+            headers += [f"{name}_mean", f"{name}_ci"]
+        super().__init__(filepath, self._format, headers, delimiter=delimiter, buffer_size=buffer_size, 
+            flush_interval=flush_interval, append=append)
+        self.z = z
+
+    def _format(self, average):
+        statistics = average.get_statistics()
+        means = statistics.mean(axis=0)
+        if len(statistics) > 1:
+            widths = self.z * statistics.std(axis=0, ddof=1) / np.sqrt(len(statistics))
+        else:
+            widths = np.zeros(len(means))
+        return [average.generation, *np.column_stack([means, widths]).ravel()]
+
+class NumpyWriter(_BufferedWriter):
+    """ Binary, columnar alternative to the CSVWriter for long runs. Every flush writes one chunk file
+        '<prefix>.<n>.npz' that holds one array per header. The chunks can be read back with read_columns.
+    """
+    def __init__(self, prefix, format_function, headers, buffer_size=1000, flush_interval=None):
+        super().__init__(format_function, headers, buffer_size, flush_interval)
+        self.prefix = prefix
+        self.chunks = 0
 
     def finalize(self):
-        """ Only implemented so that no error is thrown. """
-        ...
+        """ Writes the remaining rows. """
+        self.flush()
+
+    def restore(self, rows):
+        """ Replaces the buffer with the one of a copy of this writer in a worker process. """
+        super().restore(rows)
+        self.chunks = len(_chunk_paths(self.prefix))
+
+    def _write_rows(self, rows):
+        columns = list(zip(*rows))
+        np.savez(f"{self.prefix}.{self.chunks:05d}.npz", **{str(header): np.array(column) for header, column in zip(self.headers, columns)})
+        self.chunks += 1
+
+def read_columns(prefix):
+    """ Reads all chunks written by a NumpyWriter and returns a dictionary that maps each header to its full column. """
+    columns = {}
+    for path in _chunk_paths(prefix):
+        with np.load(path) as chunk:
+            for header in chunk.files:
+                columns.setdefault(header, []).append(chunk[header])
+    return {header: np.concatenate(parts) for header, parts in columns.items()}
+
+def _chunk_paths(prefix):
+    return sorted(glob.glob(f"{glob.escape(prefix)}.[0-9][0-9][0-9][0-9][0-9].npz"))
 
 class HistoryWriter:
-    """ Writer that fills a History object with data. """"
+    """ Writer that fills a History object with data. """
     def __init__(self, filepath=None):
         self.history = History([], filepath=filepath)
     
     def step(self, evolution):
         """ Appends the next generation to the history. """
-        self.history.add(evolution.current_generation)
+        self.history.add({'population': np.array(evolution.current_population), 'fitness_values': np.array(evolution.current_fitness_values)})
+
+    def collect(self):
+        """ Returns the recorded generations, so that they can be sent back from a worker process. """
+        return self.history.generations
+
+    def restore(self, generations):
+        """ Replaces the history with the generations recorded by a copy of this writer in a worker process. """
+        self.history.generations = generations
 
     def finalize(self):
         """ If the history has a filepath, the data is serialized into it as JSON. """
         if self.history.filepath is not None:
             self.history.write_json()
+
+class StreamingHistoryWriter:
+    """ Writer that streams every generation into a MemmapHistory instead of keeping it in memory. """
+    def __init__(self, directory, chunk_size=100):
+        self.history = MemmapHistory(directory, chunk_size=chunk_size)
+
+    def step(self, evolution):
+        """ Appends the next generation to the history. """
+        self.history.append(evolution.current_population, evolution.current_fitness_values)
+
+    def collect(self):
+        """ Returns the number of recorded generations, so that it can be sent back from a worker process. """
+        self.history.flush()
+        return len(self.history)
+
+    def restore(self, count):
+        """ Reopens the history after a copy of this writer has continued it in a worker process. """
+        self.history = MemmapHistory(self.history.directory)
+
+    def finalize(self):
+        """ Flushes the history to disk. """
+        self.history.flush()
+
+class WriterGroup:
+    """ Writer that passes every call on to each of the given writers, e.g. a CSVWriter and a ProfileWriter. """
+    def __init__(self, *writers):
+        self.writers = writers
+
+    def step(self, evolution):
+        """ Calls step on each writer. """
+        for writer in self.writers:
+            writer.step(evolution)
+
+    def collect(self):
+        """ Returns the collected states of the writers, so that they can be sent back from a worker process. """
+        return [writer.collect() if hasattr(writer, 'collect') else None for writer in self.writers]
+
+    def restore(self, states):
+        """ Restores each writer from the states collected by a copy of this group in a worker process. """
+        for writer, state in zip(self.writers, states):
+            if state is not None:
+                writer.restore(state)
+
+    def finalize(self):
+        """ Calls finalize on each writer that has it. """
+        for writer in self.writers:
+            if hasattr(writer, 'finalize'):
+                writer.finalize()
+
+class ParetoWriter:
+    """ Writer that tracks the Pareto front of an evolution with several objectives. archive holds the non-dominated individuals
+        found over all generations and their fitness values, front_sizes the size of the Pareto front of every generation.
+        If max_size is set, the archive keeps the max_size individuals with the largest crowding distance.
+        If a filepath is given, the archive and the front sizes are saved into it as .npz when the writer is finalized.
+    """
+    def __init__(self, filepath=None, max_size=None):
+        self.filepath = filepath
+        self.max_size = max_size
+        self.archive = None
+        self.front_sizes = []
+
+    def step(self, evolution):
+        """ Merges the Pareto front of the current population into the archive. """
+        fitness_values = np.asarray(evolution.current_fitness_values, dtype=float)
+        front = pareto_front(fitness_values, evolution.proportional)
+        self.front_sizes.append(len(front))
+        population, fitness_values = evolution.current_population[front], fitness_values[front]
+        if self.archive is not None:
+            population = np.concatenate([self.archive[0], population])
+            fitness_values = np.concatenate([self.archive[1], fitness_values])
+        # Individuals found again are only kept once.
+        population, unique = np.unique(population, axis=0, return_index=True)
+        fitness_values = fitness_values[unique]
+        front = pareto_front(fitness_values, evolution.proportional)
+        population, fitness_values = population[front], fitness_values[front]
+        if self.max_size is not None and len(front) > self.max_size:
+            distances = crowding_distance(fitness_values, np.zeros(len(front), dtype=int))
+            keep = np.argsort(-distances, kind='stable')[:self.max_size]
+            population, fitness_values = population[keep], fitness_values[keep]
+        self.archive = (population, fitness_values)
+
+    def collect(self):
+        """ Returns the archive and the front sizes, so that they can be sent back from a worker process. """
+        return (self.archive, self.front_sizes)
+
+    def restore(self, state):
+        """ Replaces the archive and the front sizes with those of a copy of this writer in a worker process. """
+        self.archive, self.front_sizes = state
+
+    def finalize(self):
+        """ If the writer has a filepath, the archive is saved into it. """
+        if self.filepath is not None and self.archive is not None:
+            np.savez(self.filepath, population=self.archive[0], fitness_values=self.archive[1], front_sizes=np.array(self.front_sizes))
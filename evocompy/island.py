@@ -0,0 +1,138 @@
+import multiprocessing
+
+import numpy as np
+
+from .benchmark import RunResult, _can_fork, _seed
+
+def ring_topology(count):
+    """ Every island sends its migrants to the next island, the last one to the first. """
+    return [[(i + 1) % count] for i in range(count)] if count > 1 else [[]]
+
+def fully_connected_topology(count):
+    """ Every island sends its migrants to all other islands. """
+    return [[j for j in range(count) if j != i] for i in range(count)]
+
+topology_dict = {
+    'ring': ring_topology,
+    'full': fully_connected_topology,
+}
+
+class IslandModel:
+    """ Runs several evolutions (islands) in parallel, one worker process per island. Every interval generations each island
+        sends copies of its fittest individuals (as many as migrants) along the topology, where they replace the least fit
+        individuals of the receiving islands.
+        The topology is 'ring', 'full' or a list that holds the indices of the receiving islands for each island.
+        The condition works like the one of a Benchmark and is checked before every generation; the run ends at the next
+        migration after it has failed for any island. Like the ParallelBenchmark, every island keeps its own generator,
+        the workers are forked and the final states are copied back into the evolutions. Where fork is not available,
+        the islands take turns in the current process.
+    """
+    def __init__(self, evolutions, condition, interval=10, migrants=2, topology='ring'):
+        self.evolutions = evolutions
+        self.condition = condition
+        self.interval = interval
+        self.migrants = migrants
+        self.targets = topology_dict[topology](len(evolutions)) if isinstance(topology, str) else topology
+        self.results = []
+
+    def run(self):
+        """ Runs all islands until the condition fails. """
+        global _model
+        _model = self
+        try:
+            if _can_fork():
+                self.results = self._run_forked()
+            else:
+                self.results = self._run_in_process()
+        finally:
+            _model = None
+        for evolution, result in zip(self.evolutions, self.results):
+            result.apply(evolution)
+
+    def _run_forked(self):
+        context = multiprocessing.get_context('fork')
+        connections, processes = [], []
+        for index in range(len(self.evolutions)):
+            parent, child = context.Pipe()
+            process = context.Process(target=_run_island, args=(index, child), daemon=True)
+            process.start()
+            # Only the worker keeps its end open, so that the parent gets an EOFError if the worker dies.
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+        try:
+            stop = False
+            while not stop:
+                messages = _receive(connections, processes)
+                incoming, stop = self._exchange(messages)
+                for connection, migrants in zip(connections, incoming):
+                    connection.send((migrants, stop))
+            results = _receive(connections, processes)
+        except BaseException:
+            for process in processes:
+                process.terminate()
+            raise
+        finally:
+            for process in processes:
+                process.join()
+        return results
+
+    def _run_in_process(self):
+        for evolution in self.evolutions:
+            _seed(evolution)
+        stop = False
+        while not stop:
+            messages = [self._epoch(evolution) for evolution in self.evolutions]
+            incoming, stop = self._exchange(messages)
+            for evolution, migrants in zip(self.evolutions, incoming):
+                _immigrate(evolution, migrants, stop)
+        return [RunResult.of(evolution) for evolution in self.evolutions]
+
+    def _epoch(self, evolution):
+        # Advances an island by up to interval generations and returns its migrants and whether the condition has failed.
+        for _ in range(self.interval):
+            if not self.condition(evolution):
+                return evolution.get_fittest_individuals(self.migrants) + (True,)
+            evolution.step()
+        return evolution.get_fittest_individuals(self.migrants) + (False,)
+
+    def _exchange(self, messages):
+        # Collects the migrants that every island receives from the islands sending to it.
+        stop = any(done for _, _, done in messages)
+        incoming = []
+        for i in range(len(messages)):
+            sources = [messages[j] for j, targets in enumerate(self.targets) if i in targets]
+            if stop or not sources:
+                incoming.append(None)
+            else:
+                incoming.append((np.concatenate([individuals for individuals, _, _ in sources]), np.concatenate([values for _, values, _ in sources])))
+        return (incoming, stop)
+
+# The model that is currently run. Forked workers inherit it, so the evolutions do not have to be pickled.
+_model = None
+
+def _receive(connections, processes):
+    # Receives one message from every island. A worker that died (e.g. because the condition raised) is reported as an error.
+    messages = []
+    for index, (connection, process) in enumerate(zip(connections, processes)):
+        try:
+            messages.append(connection.recv())
+        except EOFError:
+            process.join(1)
+            raise RuntimeError(f"Island {index} stopped unexpectedly (exit code {process.exitcode}), see the traceback of its worker above.") from None
+    return messages
+
+def _run_island(index, connection):
+    evolution = _model.evolutions[index]
+    _seed(evolution)
+    stop = False
+    while not stop:
+        connection.send(_model._epoch(evolution))
+        migrants, stop = connection.recv()
+        _immigrate(evolution, migrants, stop)
+    connection.send(RunResult.of(evolution))
+    connection.close()
+
+def _immigrate(evolution, migrants, stop):
+    if migrants is not None and not stop:
+        evolution.replace_least_fit(*migrants)
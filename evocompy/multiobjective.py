@@ -0,0 +1,103 @@
+import numpy as np
+
+# Multi-objective optimization:
+# With several objectives, the fitness function returns one value per objective and the fitness values of a population
+# form an array of shape (n, objectives). proportional applies to all objectives, i.e. they are either all maximized
+# or all minimized. Individuals are compared by the crowded comparison of NSGA-II: first by the rank of their
+# Pareto front, then by their crowding distance. selection.py uses this order for vector fitness values, so cutoff_selection,
+# truncation_selection, tournament_selection, rank_selection and the non-generational replacements of Evolution
+# work with several objectives as well. Evolution(..., selection_scheme=nsga2_selection, replacement='plus') is NSGA-II.
+
+def dominance_matrix(fitness_values, proportional=False, chunk_size=1024):
+    """ Returns a boolean array of shape (n, n), which is True at [i, j] if individual i dominates individual j, i.e. it is at least
+        as good in all objectives and better in at least one of them. The comparisons are vectorized in blocks of chunk_size rows.
+    """
+    objectives = _minimized(fitness_values, proportional)
+    n = len(objectives)
+    dominates = np.empty((n, n), dtype=bool)
+    for start in range(0, n, chunk_size):
+        # The objectives are compared one after another, which is much faster than reducing over a short last axis.
+        block = objectives[start:start + chunk_size]
+        not_worse = np.ones((len(block), n), dtype=bool)
+        better = np.zeros((len(block), n), dtype=bool)
+        for objective, column in zip(block.T, objectives.T):
+            not_worse &= objective[:, None] <= column
+            better |= objective[:, None] < column
+        dominates[start:start + chunk_size] = not_worse & better
+    return dominates
+
+
+def non_dominated_sort(fitness_values, proportional=False):
+    """ Fast non-dominated sort. Returns the rank of every individual: 0 for the Pareto front, 1 for the front
+        that remains after removing it and so on. Takes O(n^2) time and memory, but no Python loop over individuals.
+    """
+    dominates = dominance_matrix(fitness_values, proportional)
+    # counts[j] is the number of individuals that dominate j and have not been assigned to a front yet.
+    counts = dominates.sum(axis=0)
+    ranks = np.full(len(counts), -1)
+    front = np.flatnonzero(counts == 0)
+    rank = 0
+    while len(front):
+        ranks[front] = rank
+        counts -= dominates[front].sum(axis=0)
+        counts[front] = -1
+        front = np.flatnonzero(counts == 0)
+        rank += 1
+    return ranks
+
+
+def pareto_front(fitness_values, proportional=False):
+    """ Returns the indices of the individuals that are not dominated by any other individual. """
+    dominates = dominance_matrix(fitness_values, proportional)
+    return np.flatnonzero(~dominates.any(axis=0))
+
+
+def crowding_distance(fitness_values, ranks):
+    """ Returns the crowding distance of every individual within its front: the sum over the objectives of the distance
+        between its neighbours, relative to the extent of the front. The extreme individuals of each front get an infinite distance.
+    """
+    fitness_values = np.asarray(fitness_values, dtype=float)
+    ranks = np.asarray(ranks)
+    n = len(fitness_values)
+    distances = np.zeros(n)
+    for objective in fitness_values.T:
+        order = np.lexsort((objective, ranks))
+        values, sorted_ranks = objective[order], ranks[order]
+        # The first and the last position of the front of every (sorted) individual.
+        first = np.searchsorted(sorted_ranks, sorted_ranks, side='left')
+        last = np.searchsorted(sorted_ranks, sorted_ranks, side='right') - 1
+        positions = np.arange(n)
+        extreme = (positions == first) | (positions == last)
+        extent = values[last] - values[first]
+        inner = np.flatnonzero(~extreme & (extent > 0))
+        contribution = np.zeros(n)
+        contribution[inner] = (values[inner + 1] - values[inner - 1]) / extent[inner]
+        contribution[extreme] = np.inf
+        distances[order] += contribution
+    return distances
+
+
+def crowded_order(fitness_values, proportional=False):
+    """ Returns the indices that sort the population from the least to the most fit individual by the crowded comparison. """
+    ranks = non_dominated_sort(fitness_values, proportional)
+    return np.lexsort((crowding_distance(fitness_values, ranks), -ranks))
+
+
+def nsga2_selection(fitness_values, proportional, size=None, rng=None):
+    """ Selection scheme of NSGA-II: every individual of the next generation is the winner of a binary tournament,
+        decided by the crowded comparison.
+    """
+    n = len(fitness_values)
+    size = n if size is None else size
+    positions = np.empty(n, dtype=int)
+    positions[crowded_order(fitness_values, proportional)] = np.arange(n)
+    contestants = np.random.default_rng(rng).integers(0, n, size=(size, 2))
+    winners = np.argmax(positions[contestants], axis=1)
+    return contestants[np.arange(size), winners]
+
+
+def _minimized(fitness_values, proportional):
+    fitness_values = np.asarray(fitness_values, dtype=float)
+    if fitness_values.ndim == 1:
+        fitness_values = fitness_values[:, None]
+    return -fitness_values if proportional else fitness_values
@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Executors evaluate a fitness function over a population. The population is split into chunks,
+# which are evaluated in parallel and concatenated in their original order, so the result does
+# not depend on the scheduling of the workers.
+
+class SerialExecutor:
+    """ Evaluates the population in the calling thread. This is what Evolution does without an executor. """
+    def evaluate(self, function, population, batch=False):
+        """ Returns the fitness values of the population. If batch is set, function is called with the whole population. """
+        return _evaluate_chunk(function, population, batch)
+
+    def shutdown(self):
+        """ Only implemented so that all executors can be used interchangeably. """
+        ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class ThreadExecutor(SerialExecutor):
+    """ Evaluates chunks of the population on a thread pool. Only useful if the fitness function releases the GIL,
+        e.g. because it spends its time in numpy or in a C extension.
+    """
+    def __init__(self, workers=None, chunk_size=None):
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = ThreadPoolExecutor(self.workers)
+
+    def evaluate(self, function, population, batch=False):
+        futures = [self._pool.submit(_evaluate_chunk, function, population[start:end], batch)
+            for start, end in _chunks(len(population), self.workers, self.chunk_size)]
+        return _concatenate([future.result() for future in futures])
+
+    def shutdown(self):
+        """ Stops the worker threads. """
+        self._pool.shutdown()
+
+
+class ProcessExecutor(SerialExecutor):
+    """ Evaluates chunks of the population on a pool of worker processes.
+        The fitness function has to be picklable, it is sent to each worker only once. Populations of at least
+        shared_memory_threshold bytes are written into a shared memory block that the workers read their chunks from,
+        instead of being pickled for every generation.
+    """
+    def __init__(self, workers=None, chunk_size=None, shared_memory_threshold=2**20):
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.shared_memory_threshold = shared_memory_threshold
+        self._pool = None
+        self._function = None
+        self._shared = None
+
+    def evaluate(self, function, population, batch=False):
+        self._start(function, batch)
+        population = np.ascontiguousarray(population)
+        chunks = _chunks(len(population), self.workers, self.chunk_size)
+        if population.dtype.hasobject or population.nbytes < self.shared_memory_threshold:
+            futures = [self._pool.submit(_evaluate_installed, population[start:end]) for start, end in chunks]
+        else:
+            name = self._share(population)
+            futures = [self._pool.submit(_evaluate_shared, name, population.shape, population.dtype.str, start, end) for start, end in chunks]
+        return _concatenate([future.result() for future in futures])
+
+    def shutdown(self):
+        """ Stops the worker processes and releases the shared memory block. """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+    def _start(self, function, batch):
+        # The pool is (re)started whenever the function changes, so that it is only transferred once per worker.
+        if self._pool is not None and self._function == (function, batch):
+            return
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._function = (function, batch)
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_install, initargs=(function, batch))
+
+    def _share(self, population):
+        # The shared memory block is reused across generations and only grows when needed.
+        if self._shared is None or self._shared.size < population.nbytes:
+            if self._shared is not None:
+                self._shared.close()
+                self._shared.unlink()
+            self._shared = shared_memory.SharedMemory(create=True, size=population.nbytes)
+        np.ndarray(population.shape, population.dtype, buffer=self._shared.buf)[:] = population
+        return self._shared.name
+
+
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadExecutor,
+    'process': ProcessExecutor,
+}
+
+def to_executor(executor):
+    """ Returns an executor instance. Accepts an executor or one of the names 'serial', 'thread' and 'process'. """
+    if isinstance(executor, str):
+        return EXECUTORS[executor]()
+    return executor
+
+
+def _chunks(length, workers, chunk_size=None):
+    # Splits range(length) into (start, end) pairs, by default into a few chunks per worker to balance the load.
+    if chunk_size is None:
+        chunk_size = max(1, -(-length // (workers * 4)))
+    return [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+
+def _concatenate(results):
+    return np.concatenate(results) if results else np.array([])
+
+
+def _evaluate_chunk(function, population, batch):
+    if batch:
+        return np.asarray(function(population))
+    return np.array(list(map(function, population)))
+
+
+# Worker process state:
+
+_installed = None
+_attached = {}
+
+def _install(function, batch):
+    global _installed
+    _installed = (function, batch)
+
+
+def _evaluate_installed(population):
+    function, batch = _installed
+    return _evaluate_chunk(function, population, batch)
+
+
+def _evaluate_shared(name, shape, dtype, start, end):
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    population = np.ndarray(shape, np.dtype(dtype), buffer=_attached[name].buf)
+    function, batch = _installed
+    return _evaluate_chunk(function, population[start:end], batch)
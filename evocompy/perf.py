@@ -0,0 +1,245 @@
+"""
+Performance benchmarks for the hot paths of the engine.
+
+Usage:
+    perf.py [--quick] [--repeat=<n>] [--filter=<text>] [--output=<file>] [--baseline=<file>] [--tolerance=<ratio>]
+    perf.py -h | --help
+
+Options:
+    -h --help            Show this screen.
+    --quick              Only use the smallest sizes.
+    --repeat=<n>         Number of timed repetitions per case, the fastest one counts [default: 5].
+    --filter=<text>      Only run the cases whose name contains the text.
+    --output=<file>      Write the results as JSON into the file.
+    --baseline=<file>    Compare the results against those stored in the file.
+    --tolerance=<ratio>  Relative slowdown against the baseline that counts as a regression [default: 0.2].
+
+"""
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .evolution import mutation_operator, perturbation_operator
+from .evolutionnd import EvolutionND, sphere, rastrigin, uniform_bounds
+from .distributions import Normal
+from .selection import cutoff_selection, roulette_wheel_selection, tournament_selection, stochastic_universal_sampling
+from .io import CSVWriter, NumpyWriter
+from .examples.tsp import TSP, tsp_mutate, tsp_swap_mutate
+
+# A case times one call of a function that processes units items (individuals, evaluations or generations),
+# so that the results can be reported as a rate as well. Every case is named after its group,
+# the measured function and its parameters, e.g. 'selection/cutoff_selection[size=1000]'.
+
+SIZES = (100, 1000, 10000)
+DIMENSIONS = (2, 10, 100)
+NODECOUNTS = (20, 100, 500)
+
+
+class Case:
+    """ A benchmark case. setup() returns the function to time and is only called when the case is run. """
+    def __init__(self, group, function, parameters, units, setup):
+        self.group = group
+        self.function = function
+        self.parameters = parameters
+        self.units = units
+        self.setup = setup
+
+    @property
+    def name(self):
+        parameters = ','.join(f"{key}={value}" for key, value in self.parameters.items())
+        return f"{self.group}/{self.function}[{parameters}]"
+
+
+def cases(quick=False):
+    """ Returns the list of all benchmark cases. With quick set, only the smallest sizes are used. """
+    sizes, dimensions, nodecounts = (SIZES[:1], DIMENSIONS[:1], NODECOUNTS[:1]) if quick else (SIZES, DIMENSIONS, NODECOUNTS)
+    result = []
+    for size in sizes:
+        for scheme in (cutoff_selection, roulette_wheel_selection, stochastic_universal_sampling, tournament_selection()):
+            result.append(Case('selection', _name(scheme), {'size': size}, size, _selection(scheme, size)))
+    for size in sizes:
+        for dimension in dimensions:
+            parameters = {'size': size, 'dimensions': dimension}
+            result.append(Case('mutation', 'mutation_operator', parameters, size, _mutation(size, dimension)))
+            result.append(Case('mutation', 'perturbation_operator', parameters, size, _perturbation(size, dimension)))
+            for function in (sphere, rastrigin):
+                result.append(Case('fitness', f"{function.__name__}_batch", parameters, size, _fitness(function, size, dimension, True)))
+                result.append(Case('fitness', function.__name__, parameters, size, _fitness(function, size, dimension, False)))
+            result.append(Case('step', 'EvolutionND', parameters, 1, _step(size, dimension)))
+    for nodecount in nodecounts:
+        for size in sizes[:2]:
+            parameters = {'size': size, 'nodes': nodecount}
+            result.append(Case('mutation', 'tsp_mutate', parameters, size, _tsp_mutation(tsp_mutate(0.5, 2), nodecount, size)))
+            result.append(Case('mutation', 'tsp_swap_mutate', parameters, size, _tsp_swap_mutation(nodecount, size)))
+            result.append(Case('fitness', 'population_cost', parameters, size, _tsp_fitness(nodecount, size)))
+    for writer in ('CSVWriter', 'NumpyWriter'):
+        result.append(Case('writer', writer, {'rows': 1000}, 1000, _writer(writer, 1000)))
+    return result
+
+
+def measure(function, repeat=5, minimum_time=0.05):
+    """ Returns the fastest time of a single call of function, taken over repeat runs of at least minimum_time seconds each. """
+    number = 1
+    while True:
+        seconds = _time(function, number)
+        if seconds >= minimum_time:
+            break
+        number *= 2 if seconds == 0 else max(2, int(minimum_time / seconds) + 1)
+    best = seconds
+    for _ in range(repeat - 1):
+        best = min(best, _time(function, number))
+    return best / number
+
+
+def run(selected, repeat=5, output=print):
+    """ Runs the given cases and returns the results as a dictionary, which maps the name of each case to its timing. """
+    results = {}
+    for case in selected:
+        seconds = measure(case.setup(), repeat)
+        results[case.name] = {'seconds': seconds, 'rate': case.units / seconds, 'units': case.units}
+        output(f"{case.name:<60}{seconds * 1e6:>14.1f} us{case.units / seconds:>16.0f} /s")
+    return {'machine': _machine(), 'results': results}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """ Compares the results against the baseline. Returns a list of (name, seconds, baseline seconds, ratio)
+        for every case that is more than tolerance slower than in the baseline.
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        if name in baseline['results']:
+            ratio = result['seconds'] / baseline['results'][name]['seconds']
+            if ratio > 1 + tolerance:
+                regressions.append((name, result['seconds'], baseline['results'][name]['seconds'], ratio))
+    return regressions
+
+
+def _time(function, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        function()
+    return time.perf_counter() - start
+
+
+def _machine():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+        'processor': platform.processor(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def _name(function):
+    return function.__qualname__.split('.')[0]
+
+
+# Setups of the cases:
+
+def _selection(scheme, size):
+    def setup():
+        rng = np.random.default_rng(0)
+        fitness_values = rng.random(size)
+        return lambda: scheme(fitness_values, False, rng=rng)
+    return setup
+
+
+def _mutation(size, dimensions):
+    def setup():
+        rng = np.random.default_rng(0)
+        population = rng.random((size, dimensions))
+        operator = mutation_operator(lambda individual, rng: individual + rng.normal(0, 0.1, individual.shape))
+        return lambda: operator(population, size, rng=rng)
+    return setup
+
+
+def _perturbation(size, dimensions):
+    def setup():
+        rng = np.random.default_rng(0)
+        population = rng.random((size, dimensions))
+        operator = perturbation_operator(Normal(0.1), 0, 1)
+        return lambda: operator(population, size, rng=rng)
+    return setup
+
+
+def _fitness(function, size, dimensions, batch):
+    def setup():
+        population = np.random.default_rng(0).random((size, dimensions))
+        if batch:
+            return lambda: function(population)
+        return lambda: np.array(list(map(function, population)))
+    return setup
+
+
+def _step(size, dimensions):
+    def setup():
+        evolution = EvolutionND(sphere, uniform_bounds((-5, 5), dimensions), size, Normal(0.1), seed=0)
+        return evolution.step
+    return setup
+
+
+def _tsp_mutation(operator, nodecount, size):
+    def setup():
+        tsp = TSP(nodecount, seed=0)
+        rng = np.random.default_rng(0)
+        population = tsp.random_population(size, rng)
+        return lambda: operator(population, size, rng=rng)
+    return setup
+
+
+def _tsp_swap_mutation(nodecount, size):
+    def setup():
+        tsp = TSP(nodecount, seed=0)
+        rng = np.random.default_rng(0)
+        population = tsp.random_population(size, rng)
+        costs = tsp.population_cost(population)
+        operator = tsp_swap_mutate(tsp, 0.5, 2)
+        return lambda: operator(population, size, costs, rng=rng)
+    return setup
+
+
+def _tsp_fitness(nodecount, size):
+    def setup():
+        tsp = TSP(nodecount, seed=0)
+        population = tsp.random_population(size, np.random.default_rng(0))
+        return lambda: tsp.population_cost(population)
+    return setup
+
+
+def _writer(writer, rows):
+    # The writers are stepped with a small evolution, the files are written into a temporary directory.
+    def setup():
+        evolution = EvolutionND(sphere, uniform_bounds((-5, 5), 2), 10, Normal(0.1), seed=0)
+        formatter = lambda evolution: [evolution.generation, evolution.get_best_fitness(), evolution.get_mean_fitness()]
+        headers = ['generation', 'fittest', 'mean']
+        def result():
+            with tempfile.TemporaryDirectory() as directory:
+                if writer == 'CSVWriter':
+                    instance = CSVWriter(os.path.join(directory, 'perf.csv'), formatter, headers)
+                else:
+                    instance = NumpyWriter(os.path.join(directory, 'perf'), formatter, headers)
+                for _ in range(rows):
+                    instance.step(evolution)
+                instance.finalize()
+        return result
+    return setup
+
+
+if __name__ == '__main__':
+    from docopt import docopt
+    arguments = docopt(__doc__)
+    selected = [case for case in cases(arguments['--quick']) if not arguments['--filter'] or arguments['--filter'] in case.name]
+    results = run(selected, int(arguments['--repeat']))
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as f:
+            json.dump(results, f, indent=2)
+    if arguments['--baseline']:
+        with open(arguments['--baseline']) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, float(arguments['--tolerance']))
+        for name, seconds, baseline_seconds, ratio in regressions:
+            print(f"REGRESSION {name}: {seconds * 1e6:.1f} us, baseline {baseline_seconds * 1e6:.1f} us ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
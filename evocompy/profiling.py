@@ -0,0 +1,83 @@
+import time
+
+# Stages of a generation, in the order in which Evolution runs them: 'initialization' (only for the initial population),
+# 'selection', one stage per genetic operator named after its position in genetic_operators (e.g. 'operator 0'),
+# 'fitness', 'writer' and 'checkpoint'. Fitness evaluations that happen inside another stage count for that stage.
+
+
+class StageRecord:
+    """ Wall time, number of calls and number of fitness evaluations (individuals passed to the fitness function) of one stage. """
+    __slots__ = ('seconds', 'calls', 'evaluations')
+
+    def __init__(self, seconds=0.0, calls=0, evaluations=0):
+        self.seconds = seconds
+        self.calls = calls
+        self.evaluations = evaluations
+
+    def add(self, seconds, evaluations=0):
+        self.seconds += seconds
+        self.calls += 1
+        self.evaluations += evaluations
+
+    def __repr__(self):
+        return f"StageRecord(seconds={self.seconds}, calls={self.calls}, evaluations={self.evaluations})"
+
+
+class EvolutionStats:
+    """ Per-stage timing of an evolution. generations holds one dictionary per generation that maps the name
+        of each stage to its StageRecord. The first dictionary belongs to the initial population.
+        If keep is set, only the records of the last keep generations are kept, the totals cover all of them.
+    """
+    def __init__(self, keep=None):
+        self.keep = keep
+        self.generations = []
+        self._totals = {}
+
+    def start(self):
+        """ Begins the records of a new generation. """
+        self.generations.append({})
+        if self.keep is not None and len(self.generations) > self.keep:
+            del self.generations[0]
+
+    def record(self, stage, seconds, evaluations=0):
+        """ Adds one call of stage to the current generation. """
+        current = self.generations[-1]
+        if stage not in current:
+            current[stage] = StageRecord()
+        current[stage].add(seconds, evaluations)
+        if stage not in self._totals:
+            self._totals[stage] = StageRecord()
+        self._totals[stage].add(seconds, evaluations)
+
+    def current(self):
+        """ Returns the records of the current generation. """
+        return self.generations[-1] if self.generations else {}
+
+    def totals(self):
+        """ Returns the records of each stage summed over all generations. """
+        return dict(self._totals)
+
+    def summary(self):
+        """ Returns a table of the totals, with the share of the overall time spent in each stage. """
+        overall = sum(record.seconds for record in self._totals.values()) or 1.0
+        lines = [f"{'stage':<16}{'seconds':>12}{'share':>8}{'calls':>10}{'evaluations':>14}"]
+        for stage, record in self._totals.items():
+            lines.append(f"{stage:<16}{record.seconds:>12.4f}{record.seconds / overall:>8.1%}{record.calls:>10}{record.evaluations:>14}")
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.summary()
+
+
+def timed(evolution, stage, function, *args, **kwargs):
+    """ Calls function and records its wall time and fitness evaluations as stage in the stats of the evolution.
+        Without stats, function is just called.
+    """
+    stats = evolution.stats
+    if stats is None:
+        return function(*args, **kwargs)
+    evaluations = evolution.evaluations
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    stats.record(stage, time.perf_counter() - start, evolution.evaluations - evaluations)
+    return result
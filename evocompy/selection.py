@@ -0,0 +1,143 @@
+import numpy as np
+
+from .multiobjective import crowded_order, nsga2_selection
+
+# Selection Methods:
+# A selection scheme is called with the fitness values of the current population, the proportional flag and
+# the generator of the evolution as rng. It returns an array of indices into the population, one for each individual
+# of the next generation (len(fitness_values) by default, or size if given). No individuals are copied and the fitness
+# function is never called again during selection. With several objectives (see multiobjective.py), individuals are 
+# ordered by the crowded comparison; the fitness proportional schemes only support a single objective.
+
+def cutoff_selection(fitness_values, proportional, size=None, rng=None):
+    """ Simple and naive selection method that simply cuts of the lower half of the population ordered by fitness. """
+    return _truncate(fitness_values, proportional, size, 0.5)
+
+
+def truncation_selection(ratio):
+    """ Returns a selection scheme that keeps the fittest ratio of the population and
+        refills the next generation with them in order. cutoff_selection is truncation_selection(0.5).
+    """
+    def result(fitness_values, proportional, size=None, rng=None):
+        return _truncate(fitness_values, proportional, size, ratio)
+    return result
+
+
+def roulette_wheel_selection(fitness_values, proportional, size=None, rng=None):
+    """ Implementation of the roulette wheel selection method. Each draw is a binary search
+        in the cumulative fitness, making the whole selection O(N log N).
+    """
+    weights = _weights(fitness_values, proportional)
+    size = len(weights) if size is None else size
+    cumulative = np.cumsum(weights)
+    alphas = np.random.default_rng(rng).uniform(0, cumulative[-1], size)
+    return np.minimum(np.searchsorted(cumulative, alphas), len(weights) - 1)
+
+
+def stochastic_universal_sampling(fitness_values, proportional, size=None, rng=None):
+    """ Variant of the roulette wheel selection that uses equally spaced pointers with a single random offset.
+        The chosen individuals are spread more evenly and the selection runs in O(N).
+    """
+    weights = _weights(fitness_values, proportional)
+    size = len(weights) if size is None else size
+    cumulative = np.cumsum(weights)
+    spacing = cumulative[-1] / size
+    pointers = np.random.default_rng(rng).uniform(0, spacing) + spacing * np.arange(size)
+    return np.minimum(np.searchsorted(cumulative, pointers), len(weights) - 1)
+
+
+def tournament_selection(k=2):
+    """ Returns a selection scheme in which every individual of the next generation is
+        the winner of a tournament between k randomly drawn contestants.
+    """
+    def result(fitness_values, proportional, size=None, rng=None):
+        fitness_values = np.asarray(fitness_values)
+        if fitness_values.ndim > 1:
+            fitness_values, proportional = _positions(fitness_values, proportional), True
+        size = len(fitness_values) if size is None else size
+        contestants = np.random.default_rng(rng).integers(0, len(fitness_values), size=(size, k))
+        scores = fitness_values[contestants]
+        winners = np.argmax(scores, axis=1) if proportional else np.argmin(scores, axis=1)
+        return contestants[np.arange(size), winners]
+    return result
+
+
+def rank_selection(pressure=1.5):
+    """ Returns a linear ranking selection scheme. The selection probability depends only on the rank of an individual,
+        pressure (between 1 and 2) is the expected number of offspring of the fittest individual.
+    """
+    def result(fitness_values, proportional, size=None, rng=None):
+        n = len(fitness_values)
+        size = n if size is None else size
+        ranks = np.empty(n)
+        ranks[_order(fitness_values, proportional)] = np.arange(n)
+        if n > 1:
+            weights = (2 - pressure) / n + 2 * ranks * (pressure - 1) / (n * (n - 1))
+        else:
+            weights = np.ones(1)
+        cumulative = np.cumsum(weights)
+        alphas = np.random.default_rng(rng).uniform(0, cumulative[-1], size)
+        return np.minimum(np.searchsorted(cumulative, alphas), n - 1)
+    return result
+
+
+# Selection schemes and the functions that create them, by name. See to_selection.
+selection_dict = {
+    'cutoff': cutoff_selection,
+    'roulette': roulette_wheel_selection,
+    'sus': stochastic_universal_sampling,
+    'nsga2': nsga2_selection,
+}
+
+selection_factory_dict = {
+    'truncation': truncation_selection,
+    'tournament': tournament_selection,
+    'rank': rank_selection,
+}
+
+def to_selection(string):
+    """ Creates a selection scheme from a string of the form '<name>' or '<name> <value>', e.g. 'cutoff' or 'tournament 3'. """
+    name, *values = string.split(' ')
+    if name in selection_dict:
+        return selection_dict[name]
+    return selection_factory_dict[name](*[_number(value) for value in values])
+
+
+def _number(string):
+    value = float(string)
+    return int(value) if value.is_integer() else value
+
+
+def _truncate(fitness_values, proportional, size, ratio):
+    n = len(fitness_values)
+    size = n if size is None else size
+    selected = _order(fitness_values, proportional)[int(n * (1 - ratio)):]
+    return selected[np.arange(size) % len(selected)]
+
+
+def _order(fitness_values, proportional):
+    # Indices that sort the population from the least to the most fit individual.
+    fitness_values = np.asarray(fitness_values)
+    if fitness_values.ndim > 1:
+        return crowded_order(fitness_values, proportional)
+    return np.argsort(fitness_values if proportional else -fitness_values, kind='stable')
+
+
+def _positions(fitness_values, proportional):
+    # The position of every individual in the order from the least to the most fit one.
+    positions = np.empty(len(fitness_values), dtype=int)
+    positions[_order(fitness_values, proportional)] = np.arange(len(fitness_values))
+    return positions
+
+
+def _weights(fitness_values, proportional):
+    # Non-negative selection weights. When minimizing, the distance to the worst individual is used.
+    fitness_values = np.asarray(fitness_values, dtype=float)
+    if fitness_values.ndim > 1:
+        raise ValueError("Fitness proportional selection needs a single objective.")
+    weights = fitness_values if proportional else fitness_values.max() - fitness_values
+    if weights.min() < 0:
+        weights = weights - weights.min()
+    if weights.sum() <= 0:
+        return np.ones(len(weights))
+    return weights
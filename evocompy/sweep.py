@@ -0,0 +1,252 @@
+"""
+Runs a sweep of experiments described by a JSON configuration file.
+
+Usage:
+    sweep.py <config> [--workers=<n>] [--dry-run]
+    sweep.py -h | --help
+
+Options:
+    -h --help        Show this screen.
+    --workers=<n>    Number of worker processes, overrides the configuration.
+    --dry-run        Only print the configurations that would be run.
+
+A configuration file looks like this:
+
+    {
+        "sweep": "grid",
+        "output": "results",
+        "parameters": {
+            "problem": ["sphere", "rastrigin"],
+            "dimensions": 10,
+            "population_size": [50, 200],
+            "selection": ["cutoff", "tournament 3"],
+            "distribution": "normal 0.1",
+            "crossover": [null, "blend 0.5"],
+            "generations": 200,
+            "seed": [0, 1, 2]
+        }
+    }
+
+Parameters with a list of values are swept over, all others are fixed. A grid sweep runs every combination,
+a random sweep ("sweep": "random") draws "samples" combinations using "seed". In a random sweep, a parameter
+can also be a range {"low": 0.01, "high": 1.0}, with the optional flags "log" and "integer".
+See DEFAULTS for all parameters.
+
+"""
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from .evolution import Evolution, crossover_operator
+from .evolutionnd import EvolutionND, uniform_bounds, function_dict, range_dict
+from .distributions import to_distribution
+from .selection import to_selection
+from .crossover import crossover_dict, to_crossover
+from .examples.tsp import TSP, tsp_mutate, tsp_swap_mutate, tsp_two_opt_mutate
+
+# The parameters of a single run. problem is either one of the functions of evolutionnd.py or 'tsp'.
+# dimensions and distribution only apply to the functions, nodes, instance (the seed of the nodes) and mutation
+# ('mutate', 'swap' or 'two_opt', applied mutation_number times) only to the TSP.
+DEFAULTS = {
+    'problem': 'sphere',
+    'dimensions': 2,
+    'nodes': 20,
+    'instance': 0,
+    'population_size': 100,
+    'selection': 'cutoff',
+    'distribution': 'normal 0.1',
+    'mutation': 'swap',
+    'mutation_probability': 1.0,
+    'mutation_number': 1,
+    'crossover': None,
+    'crossover_probability': 1.0,
+    'replacement': 'generational',
+    'elite_count': 1,
+    'generations': 100,
+    'seed': 0,
+}
+
+# error holds the exception of a failed run, whose other metrics are empty.
+METRICS = ['best_fitness', 'mean_fitness', 'median_fitness', 'generation', 'evaluations', 'seconds', 'error']
+
+
+class Sweep:
+    """ A sweep of runs, created from a configuration (see the module documentation). Every run writes its results into
+        its own JSON file in the runs subdirectory of output, named after the hash of its parameters. Runs whose file
+        already exists are skipped, so an interrupted or extended sweep only runs what is missing. A run that raises an
+        exception is recorded with its error and does not stop the others; delete its file to run it again. Finally, the 
+        results of all runs of the sweep are written into results.csv in output.
+    """
+    def __init__(self, parameters, sweep='grid', samples=10, seed=None, output='results', workers=None):
+        self.parameters = parameters
+        self.sweep = sweep
+        self.samples = samples
+        self.seed = seed
+        self.output = output
+        self.workers = workers or os.cpu_count()
+
+    @classmethod
+    def from_file(cls, path):
+        """ Reads a sweep from a JSON configuration file. """
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def configurations(self):
+        """ Returns the list of run configurations, each one a dictionary of all parameters. """
+        if self.sweep == 'grid':
+            combinations = _grid(self.parameters)
+        elif self.sweep == 'random':
+            combinations = _random(self.parameters, self.samples, np.random.default_rng(self.seed))
+        else:
+            raise ValueError(f"Unknown sweep {self.sweep!r}, expected 'grid' or 'random'.")
+        unknown = set(self.parameters) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown parameters {', '.join(sorted(unknown))}.")
+        configurations, seen = [], set()
+        for combination in combinations:
+            configuration = dict(DEFAULTS, **combination)
+            key = configuration_hash(configuration)
+            if key not in seen:
+                seen.add(key)
+                configurations.append(configuration)
+        return configurations
+
+    def pending(self):
+        """ Returns the configurations whose results do not exist yet. """
+        return [configuration for configuration in self.configurations() if not os.path.exists(self._path(configuration))]
+
+    def run(self):
+        """ Runs all pending configurations on a pool of worker processes and writes the results table.
+            Returns the results of all configurations.
+        """
+        pending = self.pending()
+        os.makedirs(os.path.join(self.output, 'runs'), exist_ok=True)
+        if pending:
+            with multiprocessing.Pool(min(self.workers, len(pending))) as pool:
+                for configuration, results in zip(pending, pool.imap(run_configuration, pending)):
+                    _write_json(self._path(configuration), {'configuration': configuration, 'results': results})
+        return self.write_table()
+
+    def write_table(self):
+        """ Writes the parameters and results of every run of the sweep that has finished into results.csv.
+            Returns the rows as dictionaries.
+        """
+        rows = []
+        for configuration in self.configurations():
+            path = self._path(configuration)
+            if os.path.exists(path):
+                with open(path) as f:
+                    rows.append(dict(configuration, **json.load(f)['results']))
+        with open(os.path.join(self.output, 'results.csv'), mode='w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=[*DEFAULTS, *METRICS])
+            writer.writeheader()
+            writer.writerows(rows)
+        return rows
+
+    def _path(self, configuration):
+        return os.path.join(self.output, 'runs', f"{configuration_hash(configuration)}.json")
+
+
+def configuration_hash(configuration):
+    """ Returns a short hash that identifies the configuration. """
+    return hashlib.sha1(json.dumps(configuration, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def build_evolution(configuration):
+    """ Creates the evolution described by the configuration. """
+    c = configuration
+    selection = to_selection(c['selection'])
+    # The crossovers of crossover_dict work on permutations, the others on real-valued vectors.
+    if c['crossover'] is not None and (c['crossover'].split(' ')[0] in crossover_dict) != (c['problem'] == 'tsp'):
+        kind = 'permutations' if c['problem'] == 'tsp' else 'real-valued vectors'
+        raise ValueError(f"Crossover {c['crossover']!r} cannot be used with the problem {c['problem']!r}, which needs a crossover for {kind}.")
+    if c['problem'] == 'tsp':
+        tsp = TSP(c['nodes'], seed=c['instance'])
+        operators = [_tsp_mutation(tsp, c['mutation'], c['mutation_probability'], c['mutation_number'])]
+        if c['crossover'] is not None:
+            operators.insert(0, crossover_operator(to_crossover(c['crossover']), c['crossover_probability']))
+        return Evolution(c['population_size'], tsp.random_solution, tsp.solution_cost, selection, operators, proportional=False,
+            batch_fitness_function=tsp.population_cost, batch_random_function=tsp.random_population, seed=c['seed'],
+            replacement=c['replacement'], elite_count=c['elite_count'])
+    crossover = to_crossover(c['crossover']) if c['crossover'] is not None else None
+    return EvolutionND(function_dict[c['problem']], uniform_bounds(range_dict[c['problem']], c['dimensions']), c['population_size'],
+        to_distribution(c['distribution']), selection_scheme=selection, mutation_probability=c['mutation_probability'],
+        crossover=crossover, crossover_probability=c['crossover_probability'], seed=c['seed'],
+        replacement=c['replacement'], elite_count=c['elite_count'])
+
+
+def run_configuration(configuration):
+    """ Runs the evolution described by the configuration for the given number of generations and returns its results.
+        If the run fails, the results only hold the error.
+    """
+    start = time.perf_counter()
+    try:
+        evolution = build_evolution(configuration)
+        while evolution.generation < configuration['generations']:
+            evolution.step()
+        return {'best_fitness': float(evolution.get_best_fitness()), 'mean_fitness': float(evolution.get_mean_fitness()),
+            'median_fitness': float(evolution.get_median_fitness()), 'generation': evolution.generation,
+            'evaluations': evolution.evaluations, 'seconds': time.perf_counter() - start, 'error': None}
+    except Exception as e:
+        return dict(dict.fromkeys(METRICS), seconds=time.perf_counter() - start, error=f"{type(e).__name__}: {e}")
+
+
+def _tsp_mutation(tsp, name, probability, number):
+    if name == 'mutate':
+        return tsp_mutate(probability, number)
+    if name == 'swap':
+        return tsp_swap_mutate(tsp, probability, number)
+    if name == 'two_opt':
+        return tsp_two_opt_mutate(tsp, probability, number)
+    raise ValueError(f"Unknown TSP mutation {name!r}, expected 'mutate', 'swap' or 'two_opt'.")
+
+
+def _grid(parameters):
+    names = list(parameters)
+    values = [value if isinstance(value, list) else [value] for value in parameters.values()]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def _random(parameters, samples, rng):
+    return [{name: _sample(value, rng) for name, value in parameters.items()} for _ in range(samples)]
+
+
+def _sample(value, rng):
+    if isinstance(value, list):
+        return value[rng.integers(len(value))]
+    if isinstance(value, dict):
+        low, high = value['low'], value['high']
+        if value.get('log', False):
+            sample = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            sample = float(rng.uniform(low, high))
+        return int(round(sample)) if value.get('integer', False) else sample
+    return value
+
+
+def _write_json(path, data):
+    # The file is replaced atomically, so an interrupted sweep never leaves a partial result behind.
+    temporary = f"{path}.tmp"
+    with open(temporary, mode='w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temporary, path)
+
+
+if __name__ == '__main__':
+    from docopt import docopt
+    arguments = docopt(__doc__)
+    sweep = Sweep.from_file(arguments['<config>'])
+    if arguments['--workers']:
+        sweep.workers = int(arguments['--workers'])
+    if arguments['--dry-run']:
+        for configuration in sweep.pending():
+            print(configuration_hash(configuration), json.dumps(configuration))
+    else:
+        rows = sweep.run()
+        print(f"{len(rows)} results written to {os.path.join(sweep.output, 'results.csv')}")
@@ -1,17 +1,44 @@
+import queue
+import threading
+
 import matplotlib.animation as animation
-import matplotlib.pyplot as plt
-from matplotlib import ticker, cm, style
+from matplotlib import ticker
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 import numpy as np
 
+from .evolution import Evolution
 from .evolution2d import Evolution2D
 
+class Snapshot:
+    """ Copy of the state of an evolution in one generation, which is drawn by a View while the evolution continues.
+        The evolution itself is available as evolution, e.g. for settings that do not change.
+    """
+    def __init__(self, evolution):
+        self.evolution = evolution
+        self.generation = evolution.generation
+        self.proportional = evolution.proportional
+        self.current_population = np.array(evolution.current_population)
+        self.current_fitness_values = np.array(evolution.current_fitness_values)
+
+    def get_fittest_individual(self):
+        """ Returns a 2-tuple with the fittest individual and its fitness value. """
+        # The snapshot has the attributes that Evolution uses to find the fittest individual, including several objectives.
+        index = Evolution._fittest_index(self)
+        return (self.current_population[index], self.current_fitness_values[index])
+
+
 class View:
     """ Evolutionary algorithm related plotting, using matplotlib. 
-        The animate constructor is a higher order function that takes 
+        setup(evolution, ax, fig) is called once for every evolution and should create the artists, which
+        animate(snapshot, ax, fig, i) updates for every frame from a Snapshot of the evolution. 
+        When the view is run, the evolutions are stepped by a background thread, which keeps up to queue_size snapshots ahead
+        of the animation. With headless set, the figure is rendered without pyplot and a display, e.g. for export.
     """
     
-    def __init__(self, evolutions, layout, animate, setup, interval=50, teardown=None, frames=None, blit=True, pause_generations=[1]):
+    def __init__(self, evolutions, layout, animate, setup, interval=50, teardown=None, frames=None, blit=True, pause_generations=[1], 
+            headless=False, queue_size=8):
         if not layout[0]*layout[1] >= len(evolutions):
             raise ValueError("Not enough space in specified layout. ")               
         
@@ -19,37 +46,114 @@ class View:
         self.animate = animate        
         self.rows, self.columns = layout
         self.teardown = teardown
+        self.frames = frames
+        self.blit = blit
         self.pause_generations = pause_generations
-        self.fig, self.axes = plt.subplots(self.rows, self.columns)
-        self.fig.canvas.mpl_connect('close_event', self._finalize)
+        self.queue_size = queue_size
+        if headless:
+            self.fig = Figure()
+            FigureCanvasAgg(self.fig)
+            self.axes = self.fig.subplots(self.rows, self.columns, squeeze=False)
+        else:
+            import matplotlib.pyplot as plt
+            self.fig, self.axes = plt.subplots(self.rows, self.columns)
+            self.fig.canvas.mpl_connect('close_event', self._finalize)
+            self.fig.canvas.mpl_connect('button_press_event', self._onClick)
         self.axes = np.array([self.axes]).flatten()
         self.pause = False
+        self._artists = []
+        self._queue = None
+        self._producer = None
+        self._stopped = threading.Event()
         for i, evolution in enumerate(self.evolutions):
             setup(evolution, self.axes[i], self.fig)
-        self.animation = animation.FuncAnimation(self.fig, self._animate, interval=interval, blit=blit, frames=frames)
-        self.fig.canvas.mpl_connect('button_press_event', self._onClick)
+        self.animation = None
+        if not headless:
+            self.animation = animation.FuncAnimation(self.fig, self._animate, interval=interval, blit=blit, frames=frames, cache_frame_data=False)
 
     def run(self):
         """ Runs the view on the activated matplotlib frontend. """
-        plt.show()
-
-    def export(self, filepath):
-        """ Saves the View2D as an animation to the specified path. """  
-        self.animation.save(filepath)
-
-    def _animate(self, i):
-        points = []
-        for n, evolution in enumerate(self.evolutions):
-            if not self.pause:
-                points.append(self.animate(evolution, self.axes[n], self.fig, i))
-            if evolution.generation in self.pause_generations:
+        import matplotlib.pyplot as plt
+        self._start()
+        try:
+            plt.show()
+        finally:
+            self._stop()
+
+    def export(self, filepath, frames=None, fps=None, dpi=None, writer=None):
+        """ Saves the view as an animation to the specified path. Every frame is one generation, 
+            computed in the calling thread, pause_generations are ignored. This also works for headless views, without a display. 
+        """  
+        if self.animation is not None:
+            self.animation.pause()
+        exported = animation.FuncAnimation(self.fig, self._animate, frames=frames or self.frames or 100, fargs=(False,), blit=False)
+        exported.save(filepath, writer=writer, fps=fps, dpi=dpi)
+
+    def _start(self):
+        # Starts the background thread that steps the evolutions and queues snapshots for the animation.
+        if self._producer is None:
+            self._queue = queue.Queue(self.queue_size)
+            self._stopped.clear()
+            self._producer = threading.Thread(target=self._produce, daemon=True)
+            self._producer.start()
+
+    def _stop(self):
+        if self._producer is not None:
+            self._stopped.set()
+            self._producer.join()
+            self._producer = None
+            self._queue = None
+
+    def _produce(self):
+        while not self._stopped.is_set():
+            if self.pause:
+                self._stopped.wait(0.05)
+                continue
+            frame = self._advance()
+            while not self._stopped.is_set():
+                try:
+                    self._queue.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _advance(self, interactive=True):
+        # Takes snapshots of the current generations and steps the evolutions.
+        frame = [Snapshot(evolution) for evolution in self.evolutions]
+        for evolution in self.evolutions:
+            evolution.step()
+            if interactive and evolution.generation in self.pause_generations:
                 self.pause = True
+        return frame
+
+    def _next_frame(self, interactive):
+        if not interactive:
+            return self._advance(interactive)
+        if self._queue is None:
+            return None if self.pause else self._advance()
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _animate(self, i, interactive=True):
+        # If no new generation is ready yet, the artists are left as they are.
+        frame = self._next_frame(interactive)
+        if frame is None:
+            return self._artists
+        artists = []
+        for n, snapshot in enumerate(frame):
+            result = self.animate(snapshot, self.axes[n], self.fig, i)
+            if result is not None:
+                artists.extend(result if isinstance(result, (list, tuple)) else [result])
         if self.teardown is not None:
             for n, ax in enumerate(self.axes):
                 self.teardown(ax, n)
-        return points
+        self._artists = artists
+        return artists
 
     def _finalize(self, evt):
+        self._stop()
         for evolution in self.evolutions:
             evolution.finalize_writer()
         
@@ -59,31 +163,27 @@ class View:
 class View2D(View):
     """ View for evolutions of 2 dimensional functions.
     """
-    def __init__(self, function, layout, settings, value_range, value_step, cmap=cm.Blues, interval=50, frames=None, writer=None):
+    def __init__(self, function, layout, settings, value_range, value_step, cmap='Blues', interval=50, frames=None, writer=None, vectorized=False, cache_dir=None, headless=False):
         evolutions = []
         for setting in settings:
-            evolution = Evolution2D(function, setting, value_range, value_step, writer=writer)
+            evolution = Evolution2D(function, setting, value_range, value_step, writer=writer, vectorized=vectorized)
             evolutions.append(evolution)
         self.cmap = cmap
-        self._to_remove = []
-        self.points = None
-        super().__init__(evolutions, layout, self._update, self._setup, interval=interval, frames=frames)
+        self.cache_dir = cache_dir
+        self._points = {}
+        super().__init__(evolutions, layout, self._update, self._setup, interval=interval, frames=frames, headless=headless)
 
     def _setup(self, evolution, ax, fig): 
         mi, ma = evolution.value_range
         ax.set_xlim(mi, ma)
         ax.set_ylim(mi, ma)
-        X, Y, Z = evolution.create_values()
+        X, Y, Z = evolution.create_values(cache_dir=self.cache_dir)
         X, Y = np.meshgrid(X, Y)
         ax.contourf(Y, X, Z, locator=ticker.LinearLocator(), cmap=self.cmap)
-        self._animation(evolution, ax)
-
-    def _update(self, evolution, ax, fig, i):
-        self._animation(evolution, ax)
-        evolution.step()    
-        return self.points
-
-    def _animation(self, evolution, ax):
-        transposed = evolution.current_population.transpose()
-        self.points = ax.scatter(transposed[0], transposed[1], marker='.', c='orange') 
+        # The scatter is created once and only moved in every frame.
+        self._points[ax] = ax.scatter(evolution.current_population[:, 0], evolution.current_population[:, 1], marker='.', c='orange')
 
+    def _update(self, snapshot, ax, fig, i):
+        points = self._points[ax]
+        points.set_offsets(snapshot.current_population[:, :2])
+        return points